@@ -28,6 +28,7 @@ class CategoryAdmin(admin.ModelAdmin):
     model = Category
     form = CategoryForm
     list_display = ("id", "slug", "name", "parent")
+    list_select_related = ("parent",)
     readonly_fields = ("slug",)
     actions = ["slugify"]
 
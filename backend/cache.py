@@ -0,0 +1,105 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Error, register, Tags
+from django.utils.translation import get_language
+
+GENERATION_KEY = "backend:generation:{}"
+
+CATEGORY_TREE = "category-tree"
+BUSINESS_RESPONSES = "responses:businesses"
+CATEGORY_RESPONSES = "responses:categories"
+TAG_RESPONSES = "responses:tags"
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+BUSINESS_FRAGMENTS = "fragments:business"
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Backends whose entries each process keeps to itself
+PROCESS_LOCAL_CACHES = ["django.core.cache.backends.locmem.LocMemCache"]
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    # A generation bumped in one process must reach every other one
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            "The default cache is local to each process.",
+            hint=(
+                "Writes would only invalidate the responses, indexes and "
+                "counts cached by the process making them. Configure a "
+                "shared backend, such as DatabaseCache."
+            ),
+            id="backend.E001",
+        )
+    ]
+
+
+def count_generation(model):
+    """Generation of the cached counts of `model` querysets."""
+    return f"count:{model._meta.label_lower}"
+
+
+def get_generation(name):
+    return cache.get_or_set(GENERATION_KEY.format(name), 1, None)
+
+
+def bump_generation(name):
+    """
+    Invalidate everything derived from `name` in every process sharing
+    the cache backend. Readers compare the generation they were built
+    with against `get_generation` and rebuild when it moved.
+    """
+    key = GENERATION_KEY.format(name)
+    cache.add(key, 1, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key expired between add and incr
+        cache.set(key, 1, None)
+        return 1
+
+
+def versioned_key(name, *parts):
+    """
+    Cache key that changes whenever `bump_generation(name)` is called,
+    so stale entries are simply never read again.
+    """
+    return ":".join(
+        ["backend", name, str(get_generation(name))] + [str(p) for p in parts]
+    )
+
+
+def request_digest(request, variants=()):
+    """
+    Digest of what a response depends on in the request: scheme, host
+    and path (pagination links are absolute), query parameters (in any
+    order), language and renderer, plus `variants` for what it depends
+    on outside of the request.
+    """
+    request_id = json.dumps(
+        [
+            request.scheme,
+            request.get_host(),
+            request.path,
+            sorted(request.query_params.lists()),
+            get_language(),
+            request.accepted_renderer.format,
+            list(variants),
+        ]
+    )
+    return hashlib.sha1(request_id.encode()).hexdigest()
+
+
+def response_cache_key(request, generations, variants=()):
+    """
+    Key of a rendered response under the current version of every
+    generation the response depends on.
+    """
+    versions = ".".join(str(get_generation(name)) for name in generations)
+    digest = request_digest(request, variants)
+    return f"backend:response:{versions}:{digest}"
@@ -0,0 +1,126 @@
+import re
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESSED_SIZE = 200
+# Brotli's default quality (11) is too slow for responses compressed on
+# every request
+BROTLI_QUALITY = 5
+
+ACCEPT_ENCODING_RE = re.compile(
+    r"^\s*([^\s;]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$", re.IGNORECASE
+)
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+# Content codings by order of preference: (compress, compress_sequence)
+ENCODINGS = {"gzip": (compress_string, compress_sequence)}
+if brotli is not None:
+    ENCODINGS = {
+        "br": (
+            lambda content: brotli.compress(content, quality=BROTLI_QUALITY),
+            _brotli_sequence,
+        ),
+        **ENCODINGS,
+    }
+
+
+def accepted_encoding(request):
+    """
+    Content coding of `ENCODINGS` the client prefers according to its
+    Accept-Encoding header, or None to send the response as is. Ties are
+    broken by the order of `ENCODINGS`.
+    """
+    qualities = {}
+    for coding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        match = ACCEPT_ENCODING_RE.match(coding)
+        if match is None:
+            continue
+        name, quality = match.groups()
+        try:
+            qualities[name.lower()] = float(quality or 1)
+        except ValueError:
+            continue
+
+    best, best_quality = None, 0
+    for name in ENCODINGS:
+        quality = qualities.get(name, qualities.get("*", 0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(content, encoding):
+    return ENCODINGS[encoding][0](content)
+
+
+def set_encoded_content(response, content, encoding):
+    """Replace the body of `response` by `content` compressed as `encoding`."""
+    response.content = content
+    response["Content-Length"] = str(len(content))
+    response["Content-Encoding"] = encoding
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best content coding the client accepts:
+    brotli when it is installed, else gzip. Views may compress responses
+    themselves, e.g. from the response cache: their headers are completed
+    here but their body is left alone.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            if response["Content-Encoding"] in ENCODINGS:
+                self.patch_headers(response)
+            return response
+        if not response.streaming and (
+            len(response.content) < MIN_COMPRESSED_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        compress_content, compress_stream = ENCODINGS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content
+            )
+            # The compressed length is unknown until it was all sent
+            del response["Content-Length"]
+            response["Content-Encoding"] = encoding
+        else:
+            content = compress_content(response.content)
+            if len(content) >= len(response.content):
+                return response
+            set_encoded_content(response, content, encoding)
+        self.patch_headers(response)
+        return response
+
+    @staticmethod
+    def patch_headers(response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+        # A strong ETag would claim the compressed and uncompressed bodies
+        # are byte for byte the same
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
@@ -0,0 +1,123 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from backend.cache import bump_generation, CATEGORY_RESPONSES, CATEGORY_TREE
+
+# Businesses counted by `Category.business_count`
+COUNTED_STATUS = "accepted"
+
+
+def counted_category(status, category_id, deleted_at):
+    """Category a business with these values counts in, if any."""
+    if status != COUNTED_STATUS or deleted_at is not None:
+        return None
+    return category_id
+
+
+def roll_up(paths, counts):
+    """
+    {category id: businesses of its subtree} from `paths`, {category id:
+    path}, and `counts`, {category id: businesses of the category itself}.
+    """
+    from backend.models import Category
+
+    rolled_up = Counter()
+    for pk, count in counts.items():
+        # A category's path lists its ancestors and itself
+        for ancestor in Category.path_ids(paths.get(pk, "")):
+            rolled_up[ancestor] += count
+    return {pk: rolled_up[pk] for pk in paths}
+
+
+def invalidate_category_responses():
+    # Counters are written with update(), which sends no signal. Once
+    # committed, so that no other process caches the previous counts.
+    def bump():
+        bump_generation(CATEGORY_TREE)
+        bump_generation(CATEGORY_RESPONSES)
+
+    transaction.on_commit(bump)
+
+
+def previous_counted_category(business_id):
+    """
+    Category a saved business counts in, its row locked until the end of
+    the transaction so that concurrent saves move its count one at a
+    time. Must run in the transaction writing the business.
+    """
+    from backend.models import Business
+
+    previous = (
+        Business.objects.select_for_update()
+        .filter(pk=business_id)
+        .values_list("status", "category_id", "deleted_at")
+        .first()
+    )
+    return counted_category(*previous) if previous else None
+
+
+def move_business_count(previous_category_id, category_id):
+    """
+    Move a business from the counters of a category and its ancestors to
+    the ones of another, either being None for no category. Must run in
+    the transaction writing the business.
+    """
+    from backend.models import Category
+
+    if previous_category_id == category_id:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        paths = dict(
+            Category.objects.filter(
+                pk__in=[pk for pk in (previous_category_id, category_id) if pk]
+            ).values_list("id", "path")
+        )
+        for pk, delta in ((previous_category_id, -1), (category_id, 1)):
+            if pk not in paths:
+                continue
+            Category.objects.filter(
+                pk__in=Category.path_ids(paths[pk])
+            ).update(
+                business_count=F("business_count") + delta, updated_at=now
+            )
+    invalidate_category_responses()
+
+
+def rebuild_business_counts():
+    """
+    Recount `Category.business_count` from the businesses. Returns the
+    number of categories whose counter was wrong.
+    """
+    from backend.models import Business, Category
+
+    with transaction.atomic():
+        categories = list(Category.objects.select_for_update())
+        counts = dict(
+            Business.objects.filter(
+                status=COUNTED_STATUS,
+                deleted_at__isnull=True,
+                category__isnull=False,
+            )
+            .values("category")
+            .annotate(count=Count("pk"))
+            .values_list("category", "count")
+            .order_by()
+        )
+        rolled_up = roll_up({c.pk: c.path for c in categories}, counts)
+        changed = [
+            c for c in categories if c.business_count != rolled_up[c.pk]
+        ]
+        now = timezone.now()
+        for category in changed:
+            category.business_count = rolled_up[category.pk]
+            category.updated_at = now
+        Category.objects.bulk_update(
+            changed, ["business_count", "updated_at"], batch_size=500
+        )
+        if changed:
+            invalidate_category_responses()
+    return len(changed)
@@ -0,0 +1,34 @@
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+
+from backend.models import Business
+from backend.serializers import BusinessSerializer
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def export_queryset(status="accepted"):
+    return (
+        Business.objects.filter(status=status, deleted_at__isnull=True)
+        .select_related("category")
+        .order_by("id")
+    )
+
+
+def export_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Serialized businesses of `queryset` read through a server-side cursor
+    `chunk_size` rows at a time. Relations are prefetched per chunk, so
+    memory holds a single chunk whatever the size of the table. The
+    fragment cache is bypassed to not flood it with the whole directory.
+    """
+    serializer = BusinessSerializer()
+    businesses = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(businesses, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *serializer.get_prefetch_lookups())
+        for business in chunk:
+            yield serializer.render_fragment(business)
@@ -0,0 +1,301 @@
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from backend.cache import get_generation, bump_generation
+
+logger = logging.getLogger(__name__)
+
+FACET_INDEX = "facet-index"
+FACETS = ("tags", "payment_types", "categories")
+# Facets of `facet_counts` and the facets of `FacetIndex` they count
+COUNTED_FACETS = {
+    "category": "categories",
+    "tags": "tags",
+    "payment_types": "payment_types",
+    "city": None,
+}
+
+
+def to_bitset(ids):
+    """Set of non-negative ints as an int whose bit n is set for n."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, "little")
+
+
+def from_bitset(bitset):
+    """Ids of the bits set in `bitset`, in increasing order."""
+    bits = bin(bitset)[:1:-1]
+    return [i for i, bit in enumerate(bits) if bit == "1"]
+
+
+def popcount(bitset):
+    return bin(bitset).count("1")
+
+
+class FacetIndex:
+    """
+    Process-local bitsets of business ids, one per tag, payment type and
+    category, so that businesses can be filtered on several of them and
+    counted per value with bitwise operations instead of joins.
+
+    Like `backend.search.TrigramIndex`, the process that writes patches
+    its bitsets in place once the write commits and other processes
+    rebuild theirs on their next lookup after the generation was bumped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        # facet -> value id -> bitset of business ids. The categories are
+        # the ones of the businesses, not of their subtree.
+        self._bitsets = {facet: {} for facet in FACETS}
+        # business id -> category id
+        self._categories = {}
+        # category id -> path, see `Category.path`
+        self._paths = {}
+        # category id -> bitset of the businesses of its subtree, None
+        # until needed
+        self._subtrees = None
+
+    def invalidate(self):
+        # Once committed, or other processes would rebuild from old rows
+        transaction.on_commit(lambda: bump_generation(FACET_INDEX))
+
+    def _ensure_fresh(self):
+        generation = get_generation(FACET_INDEX)
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._build()
+                self._generation = generation
+
+    def _build(self):
+        from backend.models import Business, Category
+
+        ids = {facet: defaultdict(list) for facet in FACETS}
+        for business, tag in Business.tags.through.objects.values_list(
+            "business_id", "tag_id"
+        ):
+            ids["tags"][tag].append(business)
+        for (
+            business,
+            payment_type,
+        ) in Business.payment_types.through.objects.values_list(
+            "business_id", "paymenttype_id"
+        ):
+            ids["payment_types"][payment_type].append(business)
+        categories = dict(
+            Business.objects.filter(category__isnull=False).values_list(
+                "id", "category_id"
+            )
+        )
+        for business, category in categories.items():
+            ids["categories"][category].append(business)
+
+        self._bitsets = {
+            facet: {pk: to_bitset(v) for pk, v in values.items()}
+            for facet, values in ids.items()
+        }
+        self._categories = categories
+        self._paths = dict(Category.objects.values_list("id", "path"))
+        self._subtrees = None
+        logger.debug("Facet index built")
+
+    def _patched(self):
+        """Keep this process' bitsets, patched by the caller, current."""
+        generation = bump_generation(FACET_INDEX)
+        if generation == self._generation + 1:
+            self._generation = generation
+
+    def link(self, facet, business_ids, value_ids, linked=True):
+        """Add or remove the links of businesses to values of `facet`."""
+        business_ids, value_ids = list(business_ids), list(value_ids)
+        transaction.on_commit(
+            lambda: self._link(facet, business_ids, value_ids, linked)
+        )
+
+    def unlink_business(self, facet, business_id):
+        """Remove every link of a business to values of `facet`."""
+        transaction.on_commit(
+            lambda: self._unlink_business(facet, business_id)
+        )
+
+    def unlink_value(self, facet, value_id):
+        """Remove every link of businesses to a value of `facet`."""
+        transaction.on_commit(lambda: self._unlink_value(facet, value_id))
+
+    def set_category(self, business_id, category_id):
+        transaction.on_commit(
+            lambda: self._set_category(business_id, category_id)
+        )
+
+    def remove_business(self, business_id):
+        for facet in ("tags", "payment_types"):
+            self.unlink_business(facet, business_id)
+        self.set_category(business_id, None)
+
+    # Patches of the bitsets, run once the write committed so that a
+    # rolled back write leaves them untouched
+
+    def _link(self, facet, business_ids, value_ids, linked):
+        self._ensure_fresh()
+        businesses = to_bitset(business_ids)
+        with self._lock:
+            bitsets = self._bitsets[facet]
+            for pk in value_ids:
+                bitset = bitsets.get(pk, 0)
+                if linked:
+                    bitsets[pk] = bitset | businesses
+                else:
+                    bitsets[pk] = bitset & ~businesses
+            self._patched()
+
+    def _unlink_business(self, facet, business_id):
+        self._ensure_fresh()
+        business = 1 << business_id
+        with self._lock:
+            bitsets = self._bitsets[facet]
+            for pk, bitset in bitsets.items():
+                if bitset & business:
+                    bitsets[pk] = bitset & ~business
+            self._patched()
+
+    def _unlink_value(self, facet, value_id):
+        self._ensure_fresh()
+        with self._lock:
+            self._bitsets[facet].pop(value_id, None)
+            self._patched()
+
+    def _set_category(self, business_id, category_id):
+        self._ensure_fresh()
+        business = 1 << business_id
+        with self._lock:
+            bitsets = self._bitsets["categories"]
+            previous = self._categories.pop(business_id, None)
+            if previous is not None:
+                bitsets[previous] = bitsets.get(previous, 0) & ~business
+            if category_id is not None:
+                bitsets[category_id] = bitsets.get(category_id, 0) | business
+                self._categories[business_id] = category_id
+            self._subtrees = None
+            self._patched()
+
+    def bitset(self, facet, value_id):
+        """
+        Businesses linked to a value of `facet`. For categories, the
+        businesses of the whole subtree of the category.
+        """
+        self._ensure_fresh()
+        if facet != "categories":
+            return self._bitsets[facet].get(value_id, 0)
+
+        subtrees = self._subtrees
+        if subtrees is None:
+            subtrees = self._subtrees = self._build_subtrees()
+        return subtrees.get(value_id, 0)
+
+    def _build_subtrees(self):
+        from backend.models import Category
+
+        subtrees = defaultdict(int)
+        for pk, bitset in self._bitsets["categories"].items():
+            # A category's path lists its ancestors and itself
+            for ancestor in Category.path_ids(self._paths.get(pk, "")):
+                subtrees[ancestor] |= bitset
+        return dict(subtrees)
+
+    def filter(self, **selected):
+        """
+        Bitset of the businesses with every selected tag and payment type
+        and in the subtree of one of the selected categories, e.g.
+        `filter(tags=[1, 2], categories=[3])`.
+        """
+        result = None
+        for facet, value_ids in selected.items():
+            bitsets = [self.bitset(facet, pk) for pk in value_ids]
+            if not bitsets:
+                continue
+            if facet == "categories":
+                matched = 0
+                for bitset in bitsets:
+                    matched |= bitset
+            else:
+                matched = bitsets[0]
+                for bitset in bitsets[1:]:
+                    matched &= bitset
+            result = matched if result is None else result & matched
+        return result
+
+    def counts(self, facet, businesses):
+        """
+        {value id: number of the `businesses` (a bitset) linked to it} for
+        the values of `facet` linked to at least one of them.
+        """
+        self._ensure_fresh()
+        if facet == "categories":
+            value_ids = list(self._paths)
+        else:
+            value_ids = list(self._bitsets[facet])
+        counts = {}
+        for pk in value_ids:
+            count = popcount(self.bitset(facet, pk) & businesses)
+            if count:
+                counts[pk] = count
+        return counts
+
+
+facet_index = FacetIndex()
+
+
+def facet_counts(businesses, facets):
+    """
+    Number of the `businesses` (a queryset) per value of each of the
+    `facets` of COUNTED_FACETS, most frequent first, e.g.
+    {"tags": [{"id": 1, "name": "coiffure", "count": 3}]}. A category
+    counts the businesses of its whole subtree.
+
+    The indexed facets cost one query for the ids of the businesses and
+    one for the names of the values; cities are counted in one grouped
+    query.
+    """
+    from backend.models import Address, Category, PaymentType, Tag
+
+    models = {"category": Category, "tags": Tag, "payment_types": PaymentType}
+    counted = {}
+    if any(COUNTED_FACETS[facet] for facet in facets):
+        bitset = to_bitset(businesses.values_list("pk", flat=True))
+    for facet in facets:
+        if facet == "city":
+            counted[facet] = [
+                {"name": row["name"], "count": row["count"]}
+                for row in Address.objects.filter(
+                    business__in=businesses.values("pk")
+                )
+                .values("city_key")
+                .annotate(
+                    name=Min("city"), count=Count("business", distinct=True)
+                )
+                .order_by("-count", "city_key")
+            ]
+            continue
+
+        counts = facet_index.counts(COUNTED_FACETS[facet], bitset)
+        fields = ["id", "name"] + (["slug"] if facet == "category" else [])
+        values = (
+            models[facet].objects.filter(pk__in=list(counts)).values(*fields)
+        )
+        counted[facet] = sorted(
+            (dict(value, count=counts[value["id"]]) for value in values),
+            key=lambda value: (-value["count"], value["name"]),
+        )
+    return counted
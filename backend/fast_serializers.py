@@ -0,0 +1,261 @@
+import operator
+from collections import defaultdict, OrderedDict
+
+from django.core.cache import cache
+
+from backend.cache import versioned_key, CATEGORY_TREE
+from backend.models import (
+    Address,
+    Category,
+    OpeningHour,
+    PaymentType,
+    Phone,
+    SocialLink,
+    Tag,
+    link_type,
+)
+from backend.serializers import (
+    BusinessSerializer,
+    CategorySerializer,
+    CompactBusinessSerializer,
+    TagSerializer,
+    cached_fragments,
+    read_category_paths,
+)
+
+
+class RowReader:
+    """
+    Render values() rows the way `serializer` renders instances. Every
+    value goes through the serializer's own field, so the output is
+    identical. `computed` maps the fields that are not columns to
+    (column, function of the column), `exclude` leaves fields out.
+    """
+
+    def __init__(self, serializer, computed=None, exclude=()):
+        self.computed = computed or {}
+        self.fields = [
+            (name, field)
+            for name, field in serializer.fields.items()
+            if name not in exclude
+        ]
+        self.columns = [
+            self.computed[name][0] if name in self.computed else field.source
+            for name, field in self.fields
+        ]
+
+    def render(self, row):
+        data = OrderedDict()
+        for (name, field), column in zip(self.fields, self.columns):
+            value = row[column]
+            if name in self.computed:
+                value = self.computed[name][1](value)
+            data[name] = (
+                None if value is None else field.to_representation(value)
+            )
+        return data
+
+
+class FastTagListSerializer:
+    """Read-only `TagSerializer` for lists, see `FastListMixin`."""
+
+    def __init__(self):
+        self.reader = RowReader(TagSerializer())
+
+    def values(self, queryset):
+        return queryset.values(*self.reader.columns)
+
+    def render(self, rows):
+        return [self.reader.render(row) for row in rows]
+
+
+class FastBusinessListSerializer:
+    """
+    Read-only `BusinessSerializer` for lists. A page is fetched as
+    values() rows and each relation with one values() query for the
+    whole page, then assembled into the same dicts as the serializer's,
+    without instantiating models or resolving attributes field by field.
+    Both share the fragment cache.
+
+    Rows of a relation come from the same queries as the serializer's
+    prefetches, so in the same order. Children of categories are sorted
+    by id.
+
+    With a `fields` selection (see `parse_field_selection`) only the
+    selected columns and relations are read, and nothing is cached.
+    """
+
+    models = {
+        "tags": Tag,
+        "phones": Phone,
+        "social_links": SocialLink,
+        "addresses": Address,
+        "business_hours": OpeningHour,
+    }
+    computed = {"social_links": {"type": ("link", link_type)}}
+
+    def __init__(self, fields=None):
+        self.selection = fields
+        self.fields = BusinessSerializer(fields=fields).fields
+        relations = BusinessSerializer.prefetch_lookups
+        # The position of the pages is read from `id` and `name`
+        self.columns = ["id", "name", "updated_at"]
+        if "category" in self.fields:
+            self.columns.append("category")
+        for name, field in self.fields.items():
+            if name not in relations and field.source not in self.columns:
+                self.columns.append(field.source)
+        self.readers = {
+            name: RowReader(
+                self.fields[name].child, computed=self.computed.get(name)
+            )
+            for name in self.models
+            if name in self.fields
+        }
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def render(self, rows):
+        if self.selection is not None:
+            return self.render_misses(rows)
+        return cached_fragments(
+            [(row["id"], row["updated_at"], row) for row in rows],
+            self.render_misses,
+        )
+
+    def render_misses(self, rows):
+        ids = [row["id"] for row in rows]
+        relations = {
+            name: self.read_relation(self.models[name], reader, ids)
+            for name, reader in self.readers.items()
+        }
+        if "payment_types" in self.fields:
+            # PaymentType.__str__, rendered by a StringRelatedField
+            relations["payment_types"] = defaultdict(list)
+            for business, name in PaymentType.objects.filter(
+                business__in=ids
+            ).values_list("business", "name"):
+                relations["payment_types"][business].append(name)
+        if "category" in self.fields:
+            categories = self.read_categories()
+            category_fields = list(self.fields["category"].fields)
+
+        businesses = []
+        for row in rows:
+            data = OrderedDict()
+            for name, field in self.fields.items():
+                if name == "category":
+                    category = categories.get(row["category"])
+                    if category is not None:
+                        category = OrderedDict(
+                            (f, category[f]) for f in category_fields
+                        )
+                    data[name] = category
+                elif name in relations:
+                    data[name] = relations[name].get(row["id"], [])
+                else:
+                    value = row[field.source]
+                    data[name] = (
+                        None
+                        if value is None
+                        else field.to_representation(value)
+                    )
+            businesses.append(data)
+        return businesses
+
+    @staticmethod
+    def read_relation(model, reader, business_ids):
+        rendered = defaultdict(list)
+        for row in model.objects.filter(business__in=business_ids).values(
+            "business", *reader.columns
+        ):
+            rendered[row["business"]].append(reader.render(row))
+        return rendered
+
+    @staticmethod
+    def read_categories():
+        """
+        Every category rendered with its subtree, by id. They are cached
+        until a category is written since lists render them over and over.
+        """
+        key = versioned_key(CATEGORY_TREE, "fragments")
+        categories = cache.get(key)
+        if categories is not None:
+            return categories
+
+        reader = RowReader(CategorySerializer(), exclude=("children",))
+        rows = Category.objects.values("parent", *reader.columns)
+        nodes = {}
+        for row in sorted(rows, key=operator.itemgetter("id")):
+            category = reader.render(row)
+            category["children"] = []
+            nodes[row["id"]] = (category, row["parent"])
+        for category, parent in nodes.values():
+            if parent in nodes:
+                nodes[parent][0]["children"].append(category)
+        categories = {pk: category for pk, (category, _) in nodes.items()}
+        cache.set(key, categories, None)
+        return categories
+
+
+class FastCompactBusinessListSerializer:
+    """
+    Read-only `CompactBusinessSerializer` for lists, built like
+    `FastBusinessListSerializer` from values() rows. It is cheap enough
+    not to be cached.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = CompactBusinessSerializer(fields=fields).fields
+        self.columns = ["id", "name"]
+        if "category" in self.fields:
+            self.columns.append("category")
+        for name, field in self.fields.items():
+            if name in ("category", "tags", "city"):
+                continue
+            if field.source not in self.columns:
+                self.columns.append(field.source)
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def render(self, rows):
+        ids = [row["id"] for row in rows]
+        relations = {}
+        if "tags" in self.fields:
+            relations["tags"] = defaultdict(list)
+            for business, name in Tag.objects.filter(
+                business__in=ids
+            ).values_list("business", "name"):
+                relations["tags"][business].append(name)
+        if "city" in self.fields:
+            relations["city"] = {}
+            for business, city in (
+                Address.objects.filter(business__in=ids)
+                .order_by("-id")
+                .values_list("business", "city")
+            ):
+                relations["city"][business] = city
+        if "category" in self.fields:
+            paths = read_category_paths()
+
+        businesses = []
+        for row in rows:
+            data = OrderedDict()
+            for name, field in self.fields.items():
+                if name == "category":
+                    data[name] = paths.get(row["category"])
+                elif name == "tags":
+                    data[name] = relations[name].get(row["id"], [])
+                elif name == "city":
+                    data[name] = relations[name].get(row["id"])
+                else:
+                    value = row[field.source]
+                    data[name] = (
+                        None
+                        if value is None
+                        else field.to_representation(value)
+                    )
+            businesses.append(data)
+        return businesses
@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from backend.facets import facet_index, from_bitset, popcount, FACETS
+from backend.fulltext import get_search_backend
+from backend.geo import (
+    addresses_near,
+    businesses_near,
+    nearest_businesses,
+    parse_near,
+    DEFAULT_RADIUS_KM,
+    MAX_NEAREST,
+)
+from backend.hours import parse_moment, slot_lookup
+from backend.models import BusinessOpenHour
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Search businesses with the full-text backend of the database, see
+    `backend.fulltext`. Results are ordered by relevance.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, search_terms)
+
+
+class FacetFilter(filters.BaseFilterBackend):
+    """
+    `?tags=1,2` keeps the businesses with every listed tag, likewise for
+    `?payment_types=`, and `?categories=3,4` the ones in the subtree of
+    any listed category. The ids come from intersecting the bitsets of
+    `facet_index` instead of joining once per value, unless there are
+    more than MAX_FILTER_IDS of them.
+    """
+
+    @staticmethod
+    def get_selected(request):
+        """{facet: [value ids]} of the request."""
+        selected = {}
+        for facet in FACETS:
+            values = request.query_params.get(facet)
+            if not values:
+                continue
+            try:
+                selected[facet] = [int(v) for v in values.split(",")]
+            except ValueError:
+                raise ValidationError(
+                    {facet: [f"Expected comma separated ids: {values}"]}
+                )
+        return selected
+
+    def filter_queryset(self, request, queryset, view):
+        selected = self.get_selected(request)
+        if not selected:
+            return queryset
+        businesses = facet_index.filter(**selected)
+        if popcount(businesses) <= getattr(settings, "MAX_FILTER_IDS", 500):
+            return queryset.filter(pk__in=from_bitset(businesses))
+        return self.filter_in_database(queryset, selected)
+
+    @staticmethod
+    def filter_in_database(queryset, selected):
+        from backend.models import Category
+
+        for pk in selected.get("tags", ()):
+            queryset = queryset.filter(tags=pk)
+        for pk in selected.get("payment_types", ()):
+            queryset = queryset.filter(payment_types=pk)
+        if selected.get("categories"):
+            subtrees = Q(pk__in=[])
+            for path in Category.objects.filter(
+                pk__in=selected["categories"]
+            ).values_list("path", flat=True):
+                if path:
+                    subtrees |= Q(category__path__startswith=path)
+            queryset = queryset.filter(subtrees)
+        return queryset
+
+
+class NearFilter(filters.BaseFilterBackend):
+    """
+    `?near=lat,lng` keeps the businesses with an address within `radius`
+    km (DEFAULT_RADIUS_KM by default), approximated in SQL when there are
+    more than MAX_FILTER_IDS of them. With `nearest=N`, it keeps the N
+    businesses closest to the point instead, within `radius` when given,
+    and orders them by distance. Put it after the other filters: the
+    nearest businesses are taken among the ones they kept.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get("near")
+        if not near:
+            return queryset
+        nearest = request.query_params.get("nearest")
+        try:
+            latitude, longitude, radius = parse_near(
+                near, request.query_params.get("radius")
+            )
+        except ValueError as e:
+            raise ValidationError({"near": [str(e)]})
+
+        if nearest is None:
+            radius = radius or DEFAULT_RADIUS_KM
+            ids = businesses_near(latitude, longitude, radius)
+            if len(ids) <= getattr(settings, "MAX_FILTER_IDS", 500):
+                return queryset.filter(pk__in=ids)
+            addresses = addresses_near(latitude, longitude, radius)
+            return queryset.filter(pk__in=addresses.values("business_id"))
+
+        try:
+            limit = int(nearest)
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= MAX_NEAREST:
+            raise ValidationError(
+                {"nearest": [f"Expected a number up to {MAX_NEAREST}"]}
+            )
+        ids = [
+            pk
+            for pk, _ in nearest_businesses(
+                queryset, latitude, longitude, limit, radius
+            )
+        ]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(
+            Case(
+                *(When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)),
+                output_field=IntegerField(),
+            )
+        )
+
+
+class OpenAtFilter(filters.BaseFilterBackend):
+    """
+    `?open_now=1` keeps the businesses open now and `?open_at=<ISO 8601
+    datetime>` the ones open at that moment, from the indexed
+    `BusinessOpenHour` rows of the hour of that moment whose quarters
+    include it. Naive datetimes are in TIME_ZONE.
+    """
+
+    @staticmethod
+    def is_open_now(request):
+        return not request.query_params.get("open_at") and (
+            request.query_params.get("open_now") in ("1", "true")
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        open_at = request.query_params.get("open_at")
+        if open_at:
+            try:
+                moment = parse_moment(open_at)
+            except ValueError as e:
+                raise ValidationError({"open_at": [str(e)]})
+        elif self.is_open_now(request):
+            moment = timezone.now()
+        else:
+            return queryset
+
+        hour, quarters = slot_lookup(moment)
+        return queryset.filter(
+            pk__in=BusinessOpenHour.objects.filter(
+                hour=hour, quarters__in=quarters
+            ).values("business")
+        )
@@ -0,0 +1,289 @@
+import re
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import F, FloatField, Func, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from modeltranslation.utils import build_localized_fieldname
+
+from backend.search import fold, trigram_index, TRANSLATED_TEXT_FIELDS
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(terms):
+    return [t for term in terms for t in TOKEN_RE.findall(fold(term))]
+
+
+class RowRank(Func):
+    """
+    Rank of each business computed by the correlated `sql`, in which
+    `{pk}` stands for the business id. The id is compiled by Django, so
+    the rank holds when the queryset is relabeled as a subquery.
+    """
+
+    output_field = FloatField()
+
+    def __init__(self, sql, params):
+        super().__init__(F("pk"))
+        self.sql = sql
+        self.params = params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk, pk_params = compiler.compile(self.source_expressions[0])
+        return f"({self.sql.format(pk=pk)})", [*self.params, *pk_params]
+
+
+def documents(businesses):
+    """
+    Searchable text of each business as (id, fields) where fields maps
+    "name", "tags" and the translated fields ("slogan", "description")
+    to {language code: text}. `businesses` may be a historical queryset
+    so that migrations can build the index too.
+    """
+    for business in businesses.prefetch_related("tags"):
+        tags = " ".join(t.name for t in business.tags.all())
+        fields = {"name": business.name, "tags": tags}
+        for field in TRANSLATED_TEXT_FIELDS:
+            fields[field] = {
+                code: getattr(business, build_localized_fieldname(field, code))
+                or ""
+                for code, _ in settings.LANGUAGES
+            }
+        yield business.pk, fields
+
+
+class SearchBackend:
+    """
+    Full-text search over businesses. Backends keep their own index up to
+    date through `index`/`remove` and rank the matches in `search`.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self, schema_editor):
+        pass
+
+    def drop(self, schema_editor):
+        pass
+
+    def index(self, documents):
+        pass
+
+    def remove(self, business_ids):
+        pass
+
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+
+class TrigramSearchBackend(SearchBackend):
+    """
+    Substring search for databases without a full-text engine. The
+    trigram index narrows the rows the `contains` lookups run on, unless
+    a term has more than MAX_FILTER_IDS candidates (short or common
+    terms). Names and tags are compared on their folded keys.
+    """
+
+    def search(self, queryset, terms):
+        max_ids = getattr(settings, "MAX_FILTER_IDS", 500)
+        for term in terms:
+            key = fold(term)
+            candidates = trigram_index.candidates(key, ("name", "tag", "text"))
+            if len(candidates) <= max_ids:
+                queryset = queryset.filter(pk__in=candidates)
+            queryset = queryset.filter(
+                Q(name_key__contains=key)
+                | Q(tags__name_key__contains=key)
+                | Q(slogan__icontains=term)
+                | Q(description__icontains=term)
+            )
+        return queryset.distinct()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 shadow table keyed on the business id. Every term is matched as
+    a word prefix, accents and case are folded by the tokenizer and the
+    results are ranked with bm25, names and tags weighing the most.
+    """
+
+    table = "backend_business_fts"
+    weights = (10.0, 10.0, 2.0, 1.0)
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            "name, tags, slogan, description, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE {self.table}")
+
+    def index(self, documents):
+        rows = [
+            (
+                pk,
+                fields["name"],
+                fields["tags"],
+                " ".join(fields["slogan"].values()),
+                " ".join(fields["description"].values()),
+            )
+            for pk, fields in documents
+        ]
+        self.remove([row[0] for row in rows])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} "
+                "(rowid, name, tags, slogan, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, business_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(pk,) for pk in business_ids],
+            )
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        match = " ".join(f'"{token}"*' for token in tokens)
+        weights = ", ".join(str(w) for w in self.weights)
+        return (
+            queryset.filter(
+                pk__in=RawSQL(
+                    f"SELECT rowid FROM {self.table} "
+                    f"WHERE {self.table} MATCH %s",
+                    (match,),
+                )
+            )
+            .annotate(
+                search_rank=RowRank(
+                    f"SELECT -bm25({self.table}, {weights}) "
+                    f"FROM {self.table} WHERE {self.table} MATCH %s "
+                    "AND rowid = {pk}",
+                    (match,),
+                )
+            )
+            .order_by("-search_rank", "name")
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    `search_vector` tsvector column on the business table with a GIN
+    index. It holds the English and the French analysis of every field,
+    names and tags weighted A, slogans B and descriptions C, and is
+    matched with a prefix query in both configurations. Text and queries
+    are folded first so accents do not matter.
+    """
+
+    column = "search_vector"
+    index_name = "backend_business_search_vector"
+    configs = {"en": "english", "fr": "french"}
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f"ALTER TABLE backend_business ADD COLUMN {self.column} tsvector"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {self.index_name} ON backend_business "
+            f"USING gin ({self.column})"
+        )
+
+    def drop(self, schema_editor):
+        schema_editor.execute(
+            f"ALTER TABLE backend_business DROP COLUMN {self.column}"
+        )
+
+    def index(self, documents):
+        vectors = []
+        params = []
+        for config in self.configs.values():
+            vectors += [
+                f"setweight(to_tsvector('{config}', %s), 'A')",
+                f"setweight(to_tsvector('{config}', %s), 'B')",
+                f"setweight(to_tsvector('{config}', %s), 'C')",
+            ]
+        sql = (
+            f"UPDATE backend_business SET {self.column} = "
+            f"{' || '.join(vectors)} WHERE id = %s"
+        )
+        for pk, fields in documents:
+            params.append(
+                [
+                    fold(value)
+                    for code in self.configs
+                    for value in (
+                        f"{fields['name']} {fields['tags']}",
+                        fields["slogan"].get(code, ""),
+                        fields["description"].get(code, ""),
+                    )
+                ]
+                + [pk]
+            )
+        with self.connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        query = " & ".join(f"{token}:*" for token in tokens)
+        tsquery = " || ".join(
+            f"to_tsquery('{config}', %s)" for config in self.configs.values()
+        )
+        params = (query,) * len(self.configs)
+        table = queryset.model._meta.db_table
+        return (
+            queryset.filter(
+                pk__in=RawSQL(
+                    f"SELECT id FROM {table} "
+                    f"WHERE {self.column} @@ ({tsquery})",
+                    params,
+                )
+            )
+            .annotate(
+                search_rank=RowRank(
+                    # Aliased, the outer row may be named after the table
+                    f"SELECT ts_rank(ranked.{self.column}, {tsquery}) "
+                    f"FROM {table} ranked WHERE ranked.id = {{pk}}",
+                    params,
+                )
+            )
+            .order_by("-search_rank", "name")
+        )
+
+
+BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    """
+    The SEARCH_BACKEND setting (a dotted path) when set, otherwise the
+    native backend of the database, falling back to trigrams.
+    """
+    connection = connections[using]
+    path = getattr(settings, "SEARCH_BACKEND", None)
+    if path:
+        backend_class = import_string(path)
+    else:
+        backend_class = BACKENDS.get(connection.vendor, TrigramSearchBackend)
+    return backend_class(connection)
+
+
+def reindex(business_ids, using=DEFAULT_DB_ALIAS):
+    from backend.models import Business
+
+    businesses = Business.objects.using(using).filter(pk__in=business_ids)
+    get_search_backend(using).index(documents(businesses))
@@ -0,0 +1,305 @@
+import csv
+import math
+import os
+from functools import lru_cache
+
+EARTH_RADIUS_KM = 6371.0088
+FSA_CENTROIDS_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "fsa_centroids.csv"
+)
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 250
+MAX_NEAREST = 100
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Cells of about 5 m
+GEOHASH_PRECISION = 9
+# Cells of about 1.2 x 0.6 km: the first cells `nearest_businesses` probes
+NEAREST_START_PRECISION = 6
+
+
+@lru_cache(maxsize=None)
+def fsa_centroids():
+    """
+    (latitude, longitude) of every Canadian forward sortation area, the
+    first three characters of a postal code, see `data/README.md`.
+    """
+    with open(FSA_CENTROIDS_PATH, newline="") as f:
+        return {
+            row["fsa"]: (float(row["latitude"]), float(row["longitude"]))
+            for row in csv.DictReader(f)
+        }
+
+
+def geocode_postal_code(postal_code):
+    """
+    Approximate (latitude, longitude) of a postal code: the centroid of
+    its forward sortation area, or (None, None) when it is unknown.
+    """
+    fsa = "".join(postal_code.split()).upper()[:3]
+    return fsa_centroids().get(fsa, (None, None))
+
+
+def haversine(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points in km."""
+    lat1, lng1, lat2, lng2 = map(
+        math.radians, (latitude1, longitude1, latitude2, longitude2)
+    )
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1)))
+
+
+def bounding_box(latitude, longitude, radius):
+    """
+    (min latitude, max latitude, min longitude, max longitude) of a box
+    containing every point within `radius` km. Longitudes are not bounded
+    when the circle reaches a pole or crosses the antimeridian.
+    """
+    delta = radius / EARTH_RADIUS_KM
+    min_latitude = latitude - math.degrees(delta)
+    max_latitude = latitude + math.degrees(delta)
+    if min_latitude <= -90 or max_latitude >= 90:
+        return max(min_latitude, -90), min(max_latitude, 90), -180, 180
+
+    # Widest longitude difference on the circle, at the latitude where a
+    # meridian is tangent to it
+    delta_longitude = math.degrees(
+        math.asin(math.sin(delta) / math.cos(math.radians(latitude)))
+    )
+    min_longitude = longitude - delta_longitude
+    max_longitude = longitude + delta_longitude
+    if min_longitude < -180 or max_longitude > 180:
+        return min_latitude, max_latitude, -180, 180
+    return min_latitude, max_latitude, min_longitude, max_longitude
+
+
+def parse_near(near, radius=None):
+    """
+    (latitude, longitude, radius in km or None) from the `near=lat,lng`
+    and `radius=km` query parameters. Raises ValueError when they are
+    invalid.
+    """
+    try:
+        latitude, longitude = (float(v) for v in near.split(","))
+        radius = None if radius is None else float(radius)
+    except ValueError:
+        raise ValueError(
+            f"Invalid location {near}: expected latitude,longitude"
+        )
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"Location {near} is out of range")
+    if radius is not None and not 0 < radius <= MAX_RADIUS_KM:
+        raise ValueError(
+            f"Invalid radius {radius}: expected up to {MAX_RADIUS_KM} km"
+        )
+    return latitude, longitude, radius
+
+
+def businesses_near(latitude, longitude, radius):
+    """
+    Ids of the businesses with an address within `radius` km. Addresses
+    are prefiltered on their indexed coordinates with a bounding box, then
+    checked exactly with `haversine`.
+    """
+    from backend.models import Address
+
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(
+        latitude, longitude, radius
+    )
+    candidates = Address.objects.filter(
+        latitude__range=(min_latitude, max_latitude),
+        longitude__range=(min_longitude, max_longitude),
+    ).values_list("business_id", "latitude", "longitude")
+    return {
+        pk
+        for pk, lat, lng in candidates
+        if haversine(latitude, longitude, lat, lng) <= radius
+    }
+
+
+def addresses_near(latitude, longitude, radius):
+    """
+    Addresses within about `radius` km, filtered in SQL: the bounding box
+    on the indexed coordinates, then the equirectangular distance, which
+    needs no trigonometric SQL function and is within a fraction of a
+    percent of `haversine` up to MAX_RADIUS_KM.
+    """
+    from django.db.models import ExpressionWrapper, F, FloatField
+
+    from backend.models import Address
+
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(
+        latitude, longitude, radius
+    )
+    degree = math.radians(EARTH_RADIUS_KM)
+    scale = math.cos(math.radians(latitude))
+    offset = ExpressionWrapper(
+        (F("latitude") - latitude) * (F("latitude") - latitude)
+        + (F("longitude") - longitude)
+        * (F("longitude") - longitude)
+        * (scale * scale),
+        output_field=FloatField(),
+    )
+    return (
+        Address.objects.filter(
+            latitude__range=(min_latitude, max_latitude),
+            longitude__range=(min_longitude, max_longitude),
+        )
+        .annotate(offset=offset)
+        .filter(offset__lte=(radius / degree) ** 2)
+    )
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Geohash of a point: cells are split in two alternately on longitude
+    and latitude, five bits per character, so a point's geohash at a
+    lower precision is a prefix of its geohash.
+    """
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    value = (latitude, longitude)
+    geohash = []
+    bit = 0
+    for i in range(precision * 5):
+        # Even bits split longitudes, odd ones latitudes
+        axis = 1 - i % 2
+        middle = sum(bounds[axis]) / 2
+        if value[axis] >= middle:
+            bit = bit * 2 + 1
+            bounds[axis][0] = middle
+        else:
+            bit = bit * 2
+            bounds[axis][1] = middle
+        if i % 5 == 4:
+            geohash.append(GEOHASH_ALPHABET[bit])
+            bit = 0
+    return "".join(geohash)
+
+
+def geohash_bounds(geohash):
+    """(min latitude, max latitude, min longitude, max longitude)"""
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    i = 0
+    for char in geohash:
+        bits = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            axis = 1 - i % 2
+            middle = sum(bounds[axis]) / 2
+            bounds[axis][(bits >> shift) & 1 ^ 1] = middle
+            i += 1
+    (min_latitude, max_latitude), (min_longitude, max_longitude) = bounds
+    return min_latitude, max_latitude, min_longitude, max_longitude
+
+
+def geohash_block(geohash):
+    """`geohash` and its (up to) eight neighbours at the same precision."""
+    min_lat, max_lat, min_lng, max_lng = geohash_bounds(geohash)
+    height, width = max_lat - min_lat, max_lng - min_lng
+    latitude, longitude = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    block = set()
+    for dlat in (-height, 0, height):
+        if not -90 < latitude + dlat < 90:
+            continue
+        for dlng in (-width, 0, width):
+            lng = (longitude + dlng + 180) % 360 - 180
+            block.add(geohash_encode(latitude + dlat, lng, len(geohash)))
+    return block
+
+
+def geohash_range(prefix):
+    """
+    (first, end) such that first <= geohash < end for every geohash
+    starting with `prefix`, end being None when unbounded. Unlike a LIKE
+    'prefix%', the range can seek in a plain btree index on any database.
+    """
+    chars = list(prefix)
+    while chars:
+        position = GEOHASH_ALPHABET.index(chars[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[position + 1]
+            return prefix, "".join(chars)
+        chars.pop()
+    return prefix, None
+
+
+def covered_radius(latitude, longitude, geohash):
+    """
+    Radius in km of the largest circle around the point, which lies in
+    `geohash`, that the block of `geohash_block` contains.
+    """
+    min_lat, max_lat, min_lng, max_lng = geohash_bounds(geohash)
+    height, width = max_lat - min_lat, max_lng - min_lng
+    if width * 3 >= 360:
+        longitude_margin = math.pi
+    else:
+        # Distance to the great circle of the closest meridian of the block
+        delta = math.radians(
+            min(longitude - min_lng, max_lng - longitude) + width
+        )
+        longitude_margin = math.asin(
+            math.cos(math.radians(latitude))
+            * math.sin(min(delta, math.pi / 2))
+        )
+    latitude_margin = math.radians(
+        min(
+            latitude - max(min_lat - height, -90),
+            min(max_lat + height, 90) - latitude,
+        )
+    )
+    return EARTH_RADIUS_KM * min(latitude_margin, longitude_margin)
+
+
+def nearest_businesses(businesses, latitude, longitude, limit, radius=None):
+    """
+    The `limit` businesses of the `businesses` queryset closest to the
+    point (within `radius` km when given) as [(id, distance in km)],
+    closest first. The distance of a business is the one of its closest
+    address.
+
+    Addresses are probed in the 3 x 3 block of geohash cells around the
+    point, starting at NEAREST_START_PRECISION and one precision coarser
+    each time, until the block contains the circle holding the results.
+    That bounds the search to NEAREST_START_PRECISION + 1 queries, the
+    last one reading every address of the businesses.
+    """
+    from django.db.models import Q
+
+    from backend.models import Address
+
+    addresses = Address.objects.filter(
+        business__in=businesses.values("pk"), latitude__isnull=False
+    )
+    for precision in range(NEAREST_START_PRECISION, -1, -1):
+        if precision:
+            geohash = geohash_encode(latitude, longitude, precision)
+            probe = Q()
+            for cell in geohash_block(geohash):
+                first, end = geohash_range(cell)
+                cell_q = Q(geohash__gte=first)
+                if end is not None:
+                    cell_q &= Q(geohash__lt=end)
+                probe |= cell_q
+            candidates = addresses.filter(probe)
+            covered = covered_radius(latitude, longitude, geohash)
+        else:
+            candidates = addresses
+            covered = math.inf
+
+        distances = {}
+        for pk, lat, lng in candidates.values_list(
+            "business_id", "latitude", "longitude"
+        ):
+            distance = haversine(latitude, longitude, lat, lng)
+            if radius is None or distance <= radius:
+                distances[pk] = min(distance, distances.get(pk, math.inf))
+        nearest = sorted(distances.items(), key=lambda d: (d[1], d[0]))
+        nearest = nearest[:limit]
+        # Businesses outside the block are farther than `covered`
+        if (radius is not None and radius <= covered) or (
+            len(nearest) == limit and nearest[-1][1] <= covered
+        ):
+            return nearest
+    return nearest
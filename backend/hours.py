@@ -0,0 +1,96 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pytz.exceptions import InvalidTimeError
+
+SLOT_MINUTES = 15
+SLOTS_PER_HOUR = 60 // SLOT_MINUTES
+HOURS_PER_WEEK = 7 * 24
+SLOTS_PER_WEEK = HOURS_PER_WEEK * SLOTS_PER_HOUR
+HEX_DIGITS = "0123456789abcdef"
+
+
+def week_slot(day, time):
+    """Index of the slot starting at or before `time` on `day` (1-7)."""
+    return (
+        (day - 1) * 24 * SLOTS_PER_HOUR
+        + time.hour * SLOTS_PER_HOUR
+        + time.minute // SLOT_MINUTES
+    )
+
+
+def opening_slots(opening_hours):
+    """
+    Weekly availability of a business from its (day, opening time,
+    closing time, closed) opening hours, as the `Business.opening_slots`
+    string: one hex digit per hour of the week from Monday 0:00, whose
+    bit `q` is set when the business is open during the whole quarter
+    `q` of the hour. A closing time before the opening time is on the
+    next day; Sunday night wraps to Monday.
+    """
+    slots = [0] * HOURS_PER_WEEK
+    for day, opening_time, closing_time, closed in opening_hours:
+        if closed or opening_time is None or closing_time is None:
+            continue
+        start = week_slot(day, opening_time)
+        if opening_time.minute % SLOT_MINUTES or opening_time.second:
+            start += 1
+        end = week_slot(day, closing_time)
+        if closing_time <= opening_time:
+            end += 24 * SLOTS_PER_HOUR
+        for slot in range(start, end):
+            hour, quarter = divmod(slot % SLOTS_PER_WEEK, SLOTS_PER_HOUR)
+            slots[hour] |= 1 << quarter
+    return "".join(HEX_DIGITS[s] for s in slots)
+
+
+def local_week_slot(moment):
+    """Slot of the week of an aware datetime in the current time zone."""
+    local = timezone.localtime(moment)
+    return week_slot(local.isoweekday(), local.time())
+
+
+def open_hours(slots):
+    """
+    (hour of the week, quarters bitmask) of the hours with an open
+    quarter in an `opening_slots` string, the `BusinessOpenHour` rows of
+    the business.
+    """
+    return [
+        (hour, int(digit, 16))
+        for hour, digit in enumerate(slots)
+        if digit != "0"
+    ]
+
+
+def slot_lookup(moment):
+    """
+    (hour of the week, quarters bitmasks with the bit set) to look for
+    in `BusinessOpenHour` to find the businesses open at `moment`, an
+    aware datetime. Opening hours are wall-clock times of the current
+    time zone (TIME_ZONE), so the moment is converted to it first, which
+    takes daylight saving time into account.
+    """
+    hour, quarter = divmod(local_week_slot(moment), SLOTS_PER_HOUR)
+    quarters = [q for q in range(1 << SLOTS_PER_HOUR) if q >> quarter & 1]
+    return hour, quarters
+
+
+def parse_moment(value):
+    """
+    Aware datetime of the `open_at` query parameter, an ISO 8601
+    datetime. Naive ones are in the current time zone. Raises ValueError
+    when it is invalid.
+    """
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValueError(f"Invalid datetime {value}: expected ISO 8601")
+    if timezone.is_naive(moment):
+        try:
+            moment = timezone.make_aware(moment)
+        except InvalidTimeError:
+            # Skipped or repeated by a daylight saving time change
+            raise ValueError(f"Ambiguous or missing local time {value}")
+    return moment
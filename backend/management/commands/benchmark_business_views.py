@@ -0,0 +1,60 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from backend.fast_serializers import (
+    FastBusinessListSerializer,
+    FastCompactBusinessListSerializer,
+)
+from backend.models import Business
+from backend.pagination import DefaultPagination
+from backend.renderers import FastJSONRenderer
+
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the payload size and the uncached serialization time of "
+        "a page of businesses in the full and compact views"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=100)
+        parser.add_argument(
+            "--page-size", type=int, default=DefaultPagination.page_size
+        )
+
+    def handle(self, *args, **options):
+        queryset = Business.objects.order_by("id")[: options["page_size"]]
+        if not queryset.exists():
+            raise CommandError("No business to render, load some first")
+
+        renderer = FastJSONRenderer()
+        number = options["number"]
+        cases = [
+            ("full", FastBusinessListSerializer()),
+            ("compact", FastCompactBusinessListSerializer()),
+        ]
+
+        def render(serializer):
+            rows = list(serializer.values(queryset))
+            return renderer.render(serializer.render(rows))
+
+        # Neither fragments nor categories are read from the cache
+        with override_settings(CACHES=DUMMY_CACHES):
+            self.stdout.write(
+                f"{queryset.count()} businesses, {number} pages per view"
+            )
+            for name, serializer in cases:
+                size = len(render(serializer))
+                seconds = timeit.timeit(
+                    lambda: render(serializer), number=number
+                )
+                self.stdout.write(
+                    f"{name:<10}{size:>10} bytes"
+                    f"{seconds / number * 1e3:>10.2f} ms/page"
+                )
@@ -0,0 +1,65 @@
+import timeit
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from backend.fast_serializers import FastBusinessListSerializer
+from backend.models import Business
+from backend.pagination import DefaultPagination
+from backend.renderers import EncodedDict, FastJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSONRenderer with FastJSONRenderer on a full page "
+        "of businesses"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        serializer = FastBusinessListSerializer()
+        rows = list(serializer.values(Business.objects.order_by("id")))
+        if not rows:
+            raise CommandError("No business to render, load some first")
+        # Businesses repeat when there are not enough of them
+        page_size = DefaultPagination.max_page_size
+        items = list(islice(cycle(serializer.render_misses(rows)), page_size))
+        page = {
+            "next": None,
+            "previous": None,
+            "items_count": len(items),
+            "total_pages": 1,
+            "items": items,
+        }
+        encoded_page = dict(
+            page, items=[EncodedDict.encode(item) for item in items]
+        )
+        if FastJSONRenderer().render(encoded_page) != JSONRenderer().render(
+            page
+        ):
+            raise CommandError("The renderers disagree")
+
+        cases = [
+            ("JSONRenderer", JSONRenderer(), page),
+            ("FastJSONRenderer", FastJSONRenderer(), page),
+            (
+                "FastJSONRenderer, pre-encoded items",
+                FastJSONRenderer(),
+                encoded_page,
+            ),
+        ]
+        number = options["number"]
+        self.stdout.write(
+            f"{page_size} businesses, "
+            f"{len(JSONRenderer().render(page))} bytes, {number} renders"
+        )
+        for name, renderer, data in cases:
+            seconds = timeit.timeit(
+                lambda: renderer.render(data), number=number
+            )
+            self.stdout.write(
+                f"{name:<40}{seconds / number * 1e6:>10.1f} µs/page"
+            )
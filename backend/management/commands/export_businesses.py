@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from backend.export import export_queryset, export_records, EXPORT_CHUNK_SIZE
+from backend.renderers import CSVRenderer, NDJSONRenderer
+
+RENDERERS = {
+    renderer.format: renderer for renderer in (NDJSONRenderer, CSVRenderer)
+}
+
+
+class Command(BaseCommand):
+    help = "Stream the business directory as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(RENDERERS), default="ndjson"
+        )
+        parser.add_argument("--status", default="accepted")
+        parser.add_argument(
+            "--chunk-size", type=int, default=EXPORT_CHUNK_SIZE
+        )
+        parser.add_argument(
+            "--output", help="File to write to instead of the standard output"
+        )
+
+    def handle(self, *args, **options):
+        records = export_records(
+            export_queryset(options["status"]), options["chunk_size"]
+        )
+        lines = RENDERERS[options["format"]]().stream(records)
+        if options["output"] is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", encoding="utf-8", newline="") as f:
+            f.writelines(lines)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from backend.counters import rebuild_business_counts
+from backend.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the category paths and recount the accepted businesses of "
+        "every category's subtree"
+    )
+
+    def handle(self, *args, **options):
+        # Counts are rolled up along the paths, which bulk_create skips
+        changed = Category.rebuild_paths()
+        self.stdout.write(f"{changed} category paths fixed")
+        changed = rebuild_business_counts()
+        self.stdout.write(f"{changed} category counters fixed")
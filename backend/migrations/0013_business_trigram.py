@@ -0,0 +1,73 @@
+# Generated by Django 3.1.4 on 2026-10-18 13:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from backend.migrations._helpers import business_trigrams
+
+
+def build_trigrams(apps, schema_editor):
+    Business = apps.get_model("backend", "Business")
+    BusinessTrigram = apps.get_model("backend", "BusinessTrigram")
+    for business in Business.objects.prefetch_related("tags"):
+        tag_names = [t.name for t in business.tags.all()]
+        BusinessTrigram.objects.bulk_create(
+            BusinessTrigram(business=business, field=field, trigram=gram)
+            for field, gram in business_trigrams(business, tag_names)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0012_businesssuggestion_is_owner"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BusinessTrigram",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "field",
+                    models.CharField(
+                        choices=[
+                            ("name", "Name"),
+                            ("tag", "Tag"),
+                            ("text", "Slogan and description"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("trigram", models.CharField(max_length=3)),
+                (
+                    "business",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trigrams",
+                        to="backend.business",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="businesstrigram",
+            index=models.Index(
+                fields=["trigram", "field"],
+                name="backend_bus_trigram_9813b1_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="businesstrigram",
+            unique_together={("business", "field", "trigram")},
+        ),
+        migrations.RunPython(build_trigrams, migrations.RunPython.noop),
+    ]
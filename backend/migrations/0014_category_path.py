@@ -0,0 +1,34 @@
+# Generated by Django 3.1.4 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model("backend", "Category")
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    for category in Category.objects.all():
+        ids = [category.pk]
+        parent_id = parents[category.pk]
+        while parent_id is not None and parent_id not in ids:
+            ids.append(parent_id)
+            parent_id = parents[parent_id]
+        category.path = "".join(f"{pk}/" for pk in reversed(ids))
+        category.save(update_fields=["path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0013_business_trigram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from backend.migrations._helpers import (
+    create_fulltext_index,
+    documents,
+    drop_fulltext_index,
+    index_fulltext,
+)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    create_fulltext_index(schema_editor)
+    Business = apps.get_model("backend", "Business")
+    index_fulltext(
+        connection, documents(Business.objects.using(connection.alias))
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    drop_fulltext_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0014_category_path"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations, models
+
+from backend.migrations._helpers import (
+    business_trigrams,
+    documents,
+    fold,
+    index_fulltext,
+)
+
+
+def fill_keys(apps, schema_editor):
+    for model, field, key in [
+        ("Business", "name", "name_key"),
+        ("Tag", "name", "name_key"),
+        ("Address", "city", "city_key"),
+    ]:
+        Model = apps.get_model("backend", model)
+        for obj in Model.objects.all():
+            setattr(obj, key, fold(getattr(obj, field)))
+            obj.save(update_fields=[key])
+
+
+def rebuild_search_indexes(apps, schema_editor):
+    # Trigrams and full-text vectors are now computed on folded text
+    Business = apps.get_model("backend", "Business")
+    BusinessTrigram = apps.get_model("backend", "BusinessTrigram")
+    BusinessTrigram.objects.all().delete()
+    for business in Business.objects.prefetch_related("tags"):
+        tag_names = [t.name for t in business.tags.all()]
+        BusinessTrigram.objects.bulk_create(
+            BusinessTrigram(business=business, field=field, trigram=gram)
+            for field, gram in business_trigrams(business, tag_names)
+        )
+    connection = schema_editor.connection
+    index_fulltext(
+        connection, documents(Business.objects.using(connection.alias))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0015_business_fulltext"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="business",
+            name="name_key",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="name_key",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="city_key",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.RunPython(
+            rebuild_search_indexes, migrations.RunPython.noop
+        ),
+    ]
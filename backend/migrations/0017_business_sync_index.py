@@ -0,0 +1,20 @@
+# Generated by Django 3.1.4 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0016_folded_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="business",
+            index=models.Index(
+                fields=["updated_at", "id"],
+                name="backend_bus_updated_5ce8f3_idx",
+            ),
+        ),
+    ]
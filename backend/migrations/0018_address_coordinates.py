@@ -0,0 +1,46 @@
+# Generated by Django 3.1.4 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+from backend.migrations._helpers import postal_code_geocoder
+
+
+def geocode_addresses(apps, schema_editor):
+    Address = apps.get_model("backend", "Address")
+    geocode_postal_code = postal_code_geocoder()
+    addresses = list(Address.objects.all())
+    for address in addresses:
+        address.latitude, address.longitude = geocode_postal_code(
+            address.postal_code
+        )
+    Address.objects.bulk_update(
+        addresses, ["latitude", "longitude"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0017_business_sync_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="address",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="address",
+            index=models.Index(
+                fields=["latitude", "longitude"],
+                name="backend_add_latitud_3a330e_idx",
+            ),
+        ),
+        migrations.RunPython(geocode_addresses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+from backend.migrations._helpers import geohash_encode
+
+
+def fill_geohashes(apps, schema_editor):
+    Address = apps.get_model("backend", "Address")
+    addresses = list(Address.objects.filter(latitude__isnull=False))
+    for address in addresses:
+        address.geohash = geohash_encode(address.latitude, address.longitude)
+    Address.objects.bulk_update(addresses, ["geohash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0018_address_coordinates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="address",
+            name="geohash",
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name="address",
+            index=models.Index(
+                fields=["geohash", "business"],
+                name="backend_add_geohash_a25d24_idx",
+            ),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
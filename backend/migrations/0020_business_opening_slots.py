@@ -0,0 +1,37 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:02
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from backend.migrations._helpers import opening_slots
+
+
+def fill_opening_slots(apps, schema_editor):
+    Business = apps.get_model("backend", "Business")
+    OpeningHour = apps.get_model("backend", "OpeningHour")
+    opening_hours = defaultdict(list)
+    for business_id, *row in OpeningHour.objects.values_list(
+        "business_id", "day", "opening_time", "closing_time", "closed"
+    ):
+        opening_hours[business_id].append(row)
+    businesses = list(Business.objects.filter(pk__in=list(opening_hours)))
+    for business in businesses:
+        business.opening_slots = opening_slots(opening_hours[business.pk])
+    Business.objects.bulk_update(businesses, ["opening_slots"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0019_address_geohash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="business",
+            name="opening_slots",
+            field=models.CharField(blank=True, editable=False, max_length=168),
+        ),
+        migrations.RunPython(fill_opening_slots, migrations.RunPython.noop),
+    ]
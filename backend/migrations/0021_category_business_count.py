@@ -0,0 +1,45 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from backend.migrations._helpers import roll_up, COUNTED_STATUS
+
+
+def fill_business_counts(apps, schema_editor):
+    Business = apps.get_model("backend", "Business")
+    Category = apps.get_model("backend", "Category")
+    counts = dict(
+        Business.objects.filter(
+            status=COUNTED_STATUS,
+            deleted_at__isnull=True,
+            category__isnull=False,
+        )
+        .values("category")
+        .annotate(count=Count("pk"))
+        .values_list("category", "count")
+        .order_by()
+    )
+    categories = list(Category.objects.all())
+    rolled_up = roll_up({c.pk: c.path for c in categories}, counts)
+    for category in categories:
+        category.business_count = rolled_up[category.pk]
+    Category.objects.bulk_update(
+        categories, ["business_count"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0020_business_opening_slots"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="business_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_business_counts, migrations.RunPython.noop),
+    ]
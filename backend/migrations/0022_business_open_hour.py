@@ -0,0 +1,66 @@
+# Generated by Django 3.1.4 on 2026-10-18 14:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from backend.migrations._helpers import open_hours
+
+
+def fill_open_hours(apps, schema_editor):
+    Business = apps.get_model("backend", "Business")
+    BusinessOpenHour = apps.get_model("backend", "BusinessOpenHour")
+    BusinessOpenHour.objects.bulk_create(
+        (
+            BusinessOpenHour(business_id=pk, hour=hour, quarters=quarters)
+            for pk, slots in Business.objects.exclude(
+                opening_slots=""
+            ).values_list("pk", "opening_slots")
+            for hour, quarters in open_hours(slots)
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0021_category_business_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BusinessOpenHour",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.PositiveSmallIntegerField()),
+                ("quarters", models.PositiveSmallIntegerField()),
+                (
+                    "business",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="open_hours",
+                        to="backend.business",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="businessopenhour",
+            index=models.Index(
+                fields=["hour", "quarters"], name="backend_bus_hour_4e6aaf_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="businessopenhour",
+            unique_together={("business", "hour")},
+        ),
+        migrations.RunPython(fill_open_hours, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,250 @@
+"""
+Copies of the app helpers the data migrations compute their rows with.
+A migration must do the same on a fresh database as it did when it was
+written, so these are never edited: when a helper of the app changes, a
+new migration gets a new copy.
+"""
+
+import csv
+import os
+import unicodedata
+
+from django.conf import settings
+from modeltranslation.utils import build_localized_fieldname
+
+TRANSLATED_TEXT_FIELDS = ("slogan", "description")
+
+
+def fold(text):
+    """Lower-case `text` and strip its accents: "Montréal" -> "montreal"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def trigrams(text):
+    text = fold(text)
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def business_trigrams(business, tag_names):
+    """(field, trigram) pairs of a business, see `BusinessTrigram`."""
+    texts = [("name", business.name)]
+    texts += [("tag", tag) for tag in tag_names]
+    for field in TRANSLATED_TEXT_FIELDS:
+        for code, _ in settings.LANGUAGES:
+            text = getattr(business, build_localized_fieldname(field, code))
+            texts.append(("text", text or ""))
+    return {(field, gram) for field, text in texts for gram in trigrams(text)}
+
+
+def documents(businesses):
+    """
+    (id, fields) of each business, fields mapping "name" and "tags" to
+    their text and the translated fields to {language code: text}.
+    """
+    for business in businesses.prefetch_related("tags"):
+        tags = " ".join(t.name for t in business.tags.all())
+        fields = {"name": business.name, "tags": tags}
+        for field in TRANSLATED_TEXT_FIELDS:
+            fields[field] = {
+                code: getattr(business, build_localized_fieldname(field, code))
+                or ""
+                for code, _ in settings.LANGUAGES
+            }
+        yield business.pk, fields
+
+
+# Full-text index of the database, see `backend.fulltext`. Other databases
+# search with trigrams and have none.
+FTS_TABLE = "backend_business_fts"
+SEARCH_VECTOR = "search_vector"
+SEARCH_VECTOR_INDEX = "backend_business_search_vector"
+SEARCH_CONFIGS = {"en": "english", "fr": "french"}
+
+
+def create_fulltext_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "name, tags, slogan, description, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE backend_business ADD COLUMN {SEARCH_VECTOR} "
+            "tsvector"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {SEARCH_VECTOR_INDEX} ON backend_business "
+            f"USING gin ({SEARCH_VECTOR})"
+        )
+
+
+def drop_fulltext_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE backend_business DROP COLUMN {SEARCH_VECTOR}"
+        )
+
+
+def index_fulltext(connection, documents):
+    if connection.vendor == "sqlite":
+        rows = [
+            (
+                pk,
+                fields["name"],
+                fields["tags"],
+                " ".join(fields["slogan"].values()),
+                " ".join(fields["description"].values()),
+            )
+            for pk, fields in documents
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} "
+                "(rowid, name, tags, slogan, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+    elif connection.vendor == "postgresql":
+        vectors = [
+            f"setweight(to_tsvector('{config}', %s), '{weight}')"
+            for config in SEARCH_CONFIGS.values()
+            for weight in "ABC"
+        ]
+        sql = (
+            f"UPDATE backend_business SET {SEARCH_VECTOR} = "
+            f"{' || '.join(vectors)} WHERE id = %s"
+        )
+        params = [
+            [
+                fold(value)
+                for code in SEARCH_CONFIGS
+                for value in (
+                    f"{fields['name']} {fields['tags']}",
+                    fields["slogan"].get(code, ""),
+                    fields["description"].get(code, ""),
+                )
+            ]
+            + [pk]
+            for pk, fields in documents
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+FSA_CENTROIDS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "fsa_centroids.csv"
+)
+
+
+def postal_code_geocoder():
+    """
+    Function of a postal code returning the (latitude, longitude) of the
+    centroid of its forward sortation area, or (None, None).
+    """
+    with open(FSA_CENTROIDS_PATH, newline="") as f:
+        centroids = {
+            row["fsa"]: (float(row["latitude"]), float(row["longitude"]))
+            for row in csv.DictReader(f)
+        }
+
+    def geocode(postal_code):
+        fsa = "".join(postal_code.split()).upper()[:3]
+        return centroids.get(fsa, (None, None))
+
+    return geocode
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(latitude, longitude, precision=9):
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    value = (latitude, longitude)
+    geohash = []
+    bit = 0
+    for i in range(precision * 5):
+        # Even bits split longitudes, odd ones latitudes
+        axis = 1 - i % 2
+        middle = sum(bounds[axis]) / 2
+        if value[axis] >= middle:
+            bit = bit * 2 + 1
+            bounds[axis][0] = middle
+        else:
+            bit = bit * 2
+            bounds[axis][1] = middle
+        if i % 5 == 4:
+            geohash.append(GEOHASH_ALPHABET[bit])
+            bit = 0
+    return "".join(geohash)
+
+
+SLOT_MINUTES = 15
+SLOTS_PER_HOUR = 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * 24 * SLOTS_PER_HOUR
+
+
+def week_slot(day, time):
+    return (
+        (day - 1) * 24 * SLOTS_PER_HOUR
+        + time.hour * SLOTS_PER_HOUR
+        + time.minute // SLOT_MINUTES
+    )
+
+
+def opening_slots(opening_hours):
+    """
+    `Business.opening_slots` of (day, opening time, closing time, closed)
+    opening hours: one hex digit of quarter bits per hour of the week.
+    """
+    slots = [0] * (7 * 24)
+    for day, opening_time, closing_time, closed in opening_hours:
+        if closed or opening_time is None or closing_time is None:
+            continue
+        start = week_slot(day, opening_time)
+        if opening_time.minute % SLOT_MINUTES or opening_time.second:
+            start += 1
+        end = week_slot(day, closing_time)
+        if closing_time <= opening_time:
+            end += 24 * SLOTS_PER_HOUR
+        for slot in range(start, end):
+            hour, quarter = divmod(slot % SLOTS_PER_WEEK, SLOTS_PER_HOUR)
+            slots[hour] |= 1 << quarter
+    return "".join("0123456789abcdef"[s] for s in slots)
+
+
+def open_hours(slots):
+    """(hour, quarters) `BusinessOpenHour` rows of `opening_slots`."""
+    return [
+        (hour, int(digit, 16))
+        for hour, digit in enumerate(slots)
+        if digit != "0"
+    ]
+
+
+# Businesses counted by `Category.business_count`
+COUNTED_STATUS = "accepted"
+
+
+def roll_up(paths, counts):
+    """
+    {category id: businesses of its subtree} from {category id: path}
+    and {category id: businesses of the category itself}.
+    """
+    rolled_up = {pk: 0 for pk in paths}
+    for pk, count in counts.items():
+        for ancestor in paths.get(pk, "").split("/"):
+            if ancestor and int(ancestor) in rolled_up:
+                rolled_up[int(ancestor)] += count
+    return rolled_up
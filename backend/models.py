@@ -5,10 +5,12 @@ from urllib.parse import urlparse
 from autoslug.utils import slugify
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
+from backend.counters import rebuild_business_counts
 from users.models import CustomUser
 
 logger = logging.getLogger(__name__)
@@ -30,12 +32,13 @@ class BaseModel(models.Model):
         if self.hard_delete:
             super().delete(using, keep_parents)
         else:
-            self.deleted_at = timezone.now
+            self.deleted_at = timezone.now()
             self.save()
 
 
 class Category(BaseModel):
     MAX_LEVEL = 3
+    PATH_SEPARATOR = "/"
 
     class Meta:
         verbose_name_plural = "categories"
@@ -49,31 +52,98 @@ class Category(BaseModel):
         related_name="children",
         on_delete=models.SET_NULL,
     )
+    # Ids of the ancestors and of the category itself, from the root down,
+    # e.g. "1/4/9/". A subtree is every category whose path starts with
+    # the path of its root.
+    path = models.CharField(
+        max_length=255, blank=True, db_index=True, editable=False
+    )
+    # Accepted, non-deleted businesses of the category and its subtree,
+    # kept up to date by `backend.signals`, see `backend.counters`
+    business_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         full_path = self.get_tree()
         return ">".join(full_path[::-1])
 
+    @staticmethod
+    def path_ids(path):
+        return [int(pk) for pk in path.split(Category.PATH_SEPARATOR) if pk]
+
+    @staticmethod
+    def build_paths(parents):
+        """{id: path} from {id: parent id} of every category."""
+        paths = {}
+        for pk in parents:
+            ids = [pk]
+            parent_id = parents[pk]
+            while parent_id is not None and parent_id not in ids:
+                ids.append(parent_id)
+                parent_id = parents.get(parent_id)
+            paths[pk] = "".join(
+                f"{i}{Category.PATH_SEPARATOR}" for i in reversed(ids)
+            )
+        return paths
+
+    @classmethod
+    def rebuild_paths(cls):
+        """
+        Recompute the path of every category from the parents, for rows
+        written without save(): loaddata and bulk_create. Returns the
+        number of categories whose path was wrong.
+        """
+        categories = list(cls.objects.all())
+        paths = cls.build_paths({c.pk: c.parent_id for c in categories})
+        changed = [c for c in categories if c.path != paths[c.pk]]
+        for category in changed:
+            category.path = paths[category.pk]
+        cls.objects.bulk_update(changed, ["path"], batch_size=500)
+        return len(changed)
+
+    def get_parent_path(self):
+        if self.parent_id is None:
+            return ""
+        return self.parent.path
+
     def get_tree(self):
-        tree = [self.name]
-        k = self.parent
-        while k is not None:
-            tree.append(k.name)
-            k = k.parent
-        return tree
+        if self.path:
+            ancestor_ids = self.path_ids(self.path)[:-1]
+        else:
+            ancestor_ids = self.path_ids(self.get_parent_path())
+        names = dict(
+            Category.objects.filter(pk__in=ancestor_ids).values_list(
+                "id", "name"
+            )
+        )
+        return [self.name] + [names[pk] for pk in reversed(ancestor_ids)]
+
+    def get_descendants(self):
+        """This category and all of its subcategories."""
+        if not self.path:
+            # Every path starts with "": refuse rather than match them all
+            raise ValueError(
+                f"Category {self.pk} has no path, see `rebuild_paths`"
+            )
+        return Category.objects.filter(path__startswith=self.path)
 
     def get_children_ids(self):
-        ids = [self.id]
-        children = self.children.all()
-        for c in children:
-            if c.children:
-                ids = ids + c.get_children_ids()
-            else:
-                ids.append(c.id)
-        return ids
+        return list(self.get_descendants().values_list("id", flat=True))
+
+    def get_height(self):
+        if not self.path:
+            return 1
+        level = len(self.path_ids(self.path))
+        paths = self.get_descendants().values_list("path", flat=True)
+        return max(len(self.path_ids(p)) for p in paths) - level + 1
 
     def clean(self):
-        if len(self.get_tree()) > self.MAX_LEVEL:
+        parent_path = self.get_parent_path()
+        if self.path and parent_path.startswith(self.path):
+            raise ValidationError(
+                {"parent": _("A category cannot be its own ancestor")}
+            )
+        level = len(self.path_ids(parent_path)) + self.get_height()
+        if level > self.MAX_LEVEL:
             raise ValidationError(
                 {
                     "parent": _(
@@ -84,7 +154,31 @@ class Category(BaseModel):
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
-        super(Category, self).save(*args, **kwargs)
+        old_path = self.path
+        # The paths are written after the post_save signals, whose
+        # on_commit callbacks must see them
+        with transaction.atomic():
+            super(Category, self).save(*args, **kwargs)
+
+            self.path = (
+                f"{self.get_parent_path()}{self.pk}{self.PATH_SEPARATOR}"
+            )
+            if self.path == old_path:
+                return
+            if old_path:
+                # Move the whole subtree, this category included
+                Category.objects.filter(path__startswith=old_path).update(
+                    path=Concat(
+                        models.Value(
+                            self.path, output_field=models.CharField()
+                        ),
+                        Substr("path", len(old_path) + 1),
+                    )
+                )
+                # The businesses of the subtree moved to other ancestors
+                rebuild_business_counts()
+            else:
+                Category.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Tag(BaseModel):
@@ -92,6 +186,8 @@ class Tag(BaseModel):
         verbose_name_plural = "tags"
 
     name = models.CharField(max_length=100, unique=True)
+    # Folded `name` for accent and case insensitive lookups
+    name_key = models.CharField(max_length=255, db_index=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -117,6 +213,8 @@ class PaymentType(BaseModel):
 class Business(BaseModel):
     class Meta:
         verbose_name_plural = "businesses"
+        # Range scans of the changes feed, see `backend.sync`
+        indexes = [models.Index(fields=["updated_at", "id"])]
 
     hard_delete = False
     STATUS = [
@@ -129,6 +227,8 @@ class Business(BaseModel):
     )
     slug = models.SlugField(max_length=100)
     name = models.CharField(max_length=100, unique=True)
+    # Folded `name` for accent and case insensitive lookups
+    name_key = models.CharField(max_length=255, db_index=True, editable=False)
     slogan = models.CharField(max_length=150, blank=True)
     description = models.TextField(blank=True)
     website = models.URLField(blank=True)
@@ -143,6 +243,11 @@ class Business(BaseModel):
     last_updated_by = models.ForeignKey(
         CustomUser, null=True, on_delete=models.SET_NULL
     )
+    # Weekly availability computed from `opening_hours`, one hex digit of
+    # quarter-hour bits per hour, see `backend.hours.opening_slots`
+    opening_slots = models.CharField(
+        max_length=168, blank=True, editable=False
+    )
 
     def __str__(self):
         return self.name
@@ -156,7 +261,10 @@ class Business(BaseModel):
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
-        super(Business, self).save(*args, **kwargs)
+        # The category counters are updated by signals in the same
+        # transaction, see `backend.counters`
+        with transaction.atomic():
+            super(Business, self).save(*args, **kwargs)
 
 
 phone_exemples = [
@@ -193,6 +301,12 @@ class Phone(BaseModel):
         return self.number
 
 
+def link_type(link):
+    """Network of a social link: "https://www.facebook.com/x" -> "facebook"."""
+    domain = urlparse(str(link)).netloc
+    return ".".join(domain.split(".")[1:2])
+
+
 class SocialLink(BaseModel):
     class Meta:
         verbose_name_plural = "social links"
@@ -217,8 +331,7 @@ class SocialLink(BaseModel):
 
     @property
     def type(self):
-        domain = urlparse(str(self.link)).netloc
-        return ".".join(domain.split(".")[1:2])
+        return link_type(self.link)
 
     def __str__(self):
         return self.link
@@ -256,6 +369,10 @@ class OpeningHour(BaseModel):
 class Address(BaseModel):
     class Meta:
         verbose_name_plural = "addresses"
+        indexes = [
+            models.Index(fields=["latitude", "longitude"]),
+            models.Index(fields=["geohash", "business"]),
+        ]
 
     PROVINCES = [
         ("qc", _("Quebec")),
@@ -281,10 +398,18 @@ class Address(BaseModel):
     street_name = models.CharField(max_length=200)
     direction = models.CharField(max_length=10, blank=True)
     city = models.CharField(max_length=200, default="Montreal")
+    # Folded `city` for accent and case insensitive lookups
+    city_key = models.CharField(max_length=255, db_index=True, editable=False)
     province = models.CharField(
         max_length=100, choices=PROVINCES, default=PROVINCES[0][0]
     )
     postal_code = models.CharField(max_length=200)
+    # Centroid of the forward sortation area of `postal_code`, see
+    # `backend.geo.geocode_postal_code`
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    # Geohash of the coordinates, see `backend.geo.nearest_businesses`
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
 
 
 class BusinessSuggestion(BaseModel):
@@ -297,3 +422,46 @@ class BusinessSuggestion(BaseModel):
         related_name="suggestion",
         null=True,
     )
+
+
+class BusinessTrigram(models.Model):
+    """
+    Character trigrams of a business' searchable text, see
+    `backend.search.TrigramIndex`.
+    """
+
+    FIELDS = [
+        ("name", _("Name")),
+        ("tag", _("Tag")),
+        ("text", _("Slogan and description")),
+    ]
+
+    class Meta:
+        unique_together = ("business", "field", "trigram")
+        indexes = [models.Index(fields=["trigram", "field"])]
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="trigrams"
+    )
+    field = models.CharField(max_length=10, choices=FIELDS)
+    trigram = models.CharField(max_length=3)
+
+
+class BusinessOpenHour(models.Model):
+    """
+    Hour of the week during which a business is open at least a quarter,
+    a digit of `Business.opening_slots` stored as an indexed row, see
+    `backend.filters.OpenAtFilter`.
+    """
+
+    class Meta:
+        unique_together = ("business", "hour")
+        indexes = [models.Index(fields=["hour", "quarters"])]
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="open_hours"
+    )
+    # From Monday 0:00, 0-167
+    hour = models.PositiveSmallIntegerField()
+    # Bit `q` set when open during the whole quarter `q` of the hour
+    quarters = models.PositiveSmallIntegerField()
@@ -1,19 +1,141 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
 
+from backend.cache import versioned_key, count_generation
+
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+def estimate_count(queryset):
+    """
+    Row count estimated by the PostgreSQL planner from its table
+    statistics, or None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator caching its count per SQL statement, so paging through the
+    same filters only counts once. Entries are dropped when the model is
+    written to, see `backend.signals`.
+
+    When ESTIMATED_COUNT_THRESHOLD is set, results the planner expects to
+    be larger than it are not counted at all and `estimated` is set: the
+    count is then the planner estimate, which filters can make far off,
+    and is not cached.
+    """
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, "query"):
+            return super().count
+        try:
+            statement = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+
+        key = versioned_key(
+            count_generation(queryset.model),
+            hashlib.sha1(statement.encode()).hexdigest(),
+        )
+        count = cache.get(key)
+        if count is None:
+            estimate = self.estimate_count()
+            if estimate is not None:
+                self.estimated = True
+                return estimate
+            count = super().count
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    def estimate_count(self):
+        threshold = getattr(settings, "ESTIMATED_COUNT_THRESHOLD", None)
+        if threshold is None:
+            return None
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < threshold:
+            return None
+        return estimate
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Seeks on `name` instead of counting and offsetting, so every page
+    costs the same. Business and tag names are unique, which makes the
+    position exact; `id` only completes the ordering.
+    """
+
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 25
+    ordering = ("name", "id")
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "items": data,
+            }
+        )
+
 
 class DefaultPagination(PageNumberPagination):
+    """
+    Page number pagination, or `KeysetPagination` when the request has a
+    `cursor` parameter (an empty one asks for the first page).
+    """
+
     page_size = 25
     page_size_query_param = "page_size"
     max_page_size = 25
+    cursor_query_param = KeysetPagination.cursor_query_param
+    django_paginator_class = CachedCountPaginator
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        paginator = self.page.paginator
+        counts = {"items_count": paginator.count}
+        if paginator.estimated:
+            # Never passed off as the exact count
+            counts = {
+                "items_count": None,
+                "estimated_items_count": paginator.count,
+            }
         return Response(
             {
                 "next": self.get_next_link(),
                 "previous": self.get_previous_link(),
-                "items_count": self.page.paginator.count,
-                "total_pages": self.page.paginator.num_pages,
+                **counts,
+                "total_pages": paginator.num_pages,
                 "items": data,
             }
         )
@@ -0,0 +1,171 @@
+import csv
+import json
+import re
+import uuid
+from collections import OrderedDict
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Levels of the data searched for pre-encoded objects under the top one:
+# a page envelope, its list of items and the items
+SPLICE_DEPTH = 2
+
+
+class EncodedDict(OrderedDict):
+    """
+    Serialized object carrying its JSON `encoded` by `encode_json`, which
+    `FastJSONRenderer` splices into responses as is. Treat it as
+    read-only: the encoding is not updated when it is modified.
+    """
+
+    encoded = None
+
+    @classmethod
+    def encode(cls, data):
+        encoded = cls(data)
+        encoded.encoded = encode_json(data)
+        return encoded
+
+
+def encode_json(data):
+    """
+    Compact UTF-8 JSON of `data`, as DRF's JSONRenderer renders it. Types
+    JSON does not know (dates, decimals, lazy translations...) are
+    converted by DRF's encoder.
+    """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    try:
+        encoded = orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+    except orjson.JSONEncodeError:
+        # Integers over 64 bits, keys of mixed types...
+        return JSONRenderer().render(data)
+    # Kept a strict javascript subset, like DRF does
+    return encoded.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+        b"\xe2\x80\xa9", b"\\u2029"
+    )
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer encoding with orjson when it is installed, which
+    renders the same bytes several times faster. `EncodedDict` objects
+    found in the first SPLICE_DEPTH levels of the data are not encoded
+    again, their bytes are copied into the output. Indented output (the
+    browsable API) goes through DRF's renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        fragments = []
+        placeholder = uuid.uuid4().hex
+        data = self.extract(data, fragments, placeholder, SPLICE_DEPTH)
+        content = encode_json(data)
+        if not fragments:
+            return content
+        return re.sub(
+            rf'"{placeholder}:(\d+)"'.encode(),
+            lambda match: fragments[int(match.group(1))],
+            content,
+        )
+
+    def extract(self, data, fragments, placeholder, depth):
+        """
+        Copy of `data` where every pre-encoded object is replaced with a
+        placeholder string holding its index in `fragments`.
+        """
+        if isinstance(data, EncodedDict) and data.encoded is not None:
+            fragments.append(data.encoded)
+            return f"{placeholder}:{len(fragments) - 1}"
+        if depth == 0:
+            return data
+        if isinstance(data, dict):
+            return {
+                key: self.extract(value, fragments, placeholder, depth - 1)
+                for key, value in data.items()
+            }
+        if isinstance(data, (list, tuple)):
+            return [
+                self.extract(value, fragments, placeholder, depth - 1)
+                for value in data
+            ]
+        return data
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer of a sequence of records that can also be streamed one line
+    at a time with `stream`, see `backend.export`.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, list):
+            data = [data]
+        return "".join(self.stream(data)).encode(self.charset)
+
+    def stream(self, records):
+        raise NotImplementedError
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """One JSON document per line."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def stream(self, records):
+        for record in records:
+            yield json.dumps(record, cls=JSONEncoder, ensure_ascii=False)
+            yield "\n"
+
+
+class Echo:
+    """File-like object handing back what the csv writer writes."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    One row per record under a header made of the keys of the first one.
+    Nested values (lists and objects) are written as JSON.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, records):
+        writer = csv.writer(Echo())
+        fields = None
+        for record in records:
+            if fields is None:
+                fields = list(record)
+                yield writer.writerow(fields)
+            yield writer.writerow(
+                [self.to_cell(record.get(field)) for field in fields]
+            )
+
+    @staticmethod
+    def to_cell(value):
+        if value is None:
+            return ""
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+        return value
@@ -0,0 +1,341 @@
+import logging
+import threading
+import unicodedata
+from collections import defaultdict
+
+import textdistance
+from django.conf import settings
+from django.db import transaction
+from modeltranslation.utils import build_localized_fieldname
+
+from backend.cache import get_generation, bump_generation
+
+logger = logging.getLogger(__name__)
+
+FUZZY_INDEX = "fuzzy-index"
+TRIGRAM_INDEX = "trigram-index"
+TRANSLATED_TEXT_FIELDS = ("slogan", "description")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over a metric distance. Searching for words
+    within `radius` of a query only visits the children whose edge
+    distance is in [d - radius, d + radius] (triangle inequality).
+    """
+
+    def __init__(self, distance):
+        self.distance = distance
+        self.root = None
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node_word, children = self.root
+        while True:
+            d = self.distance(word, node_word)
+            if d == 0:
+                return
+            child = children.get(d)
+            if child is None:
+                children[d] = (word, {})
+                return
+            node_word, children = child
+
+    def search(self, word, radius):
+        if self.root is None:
+            return []
+        matches = []
+        candidates = [self.root]
+        while candidates:
+            node_word, children = candidates.pop()
+            d = self.distance(word, node_word)
+            if d <= radius:
+                matches.append(node_word)
+            for edge, child in children.items():
+                if d - radius <= edge <= d + radius:
+                    candidates.append(child)
+        return matches
+
+
+class FuzzyIndex:
+    """
+    Process-local index of business names and tag names used by the
+    autocomplete endpoint. It is built lazily from two queries and
+    rebuilt on the next lookup after `invalidate` is called from any
+    process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._tree = None
+        # folded word -> {original word: set of business ids}
+        self._words = {}
+        # business id -> (name, folded name, status, is_deleted)
+        self._businesses = {}
+        # business id -> folded tag names
+        self._tags = {}
+
+    def invalidate(self):
+        # Once committed, or other processes would reload the old rows
+        transaction.on_commit(lambda: bump_generation(FUZZY_INDEX))
+
+    def _ensure_fresh(self):
+        generation = get_generation(FUZZY_INDEX)
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._build()
+                self._generation = generation
+
+    def _build(self):
+        from backend.models import Business
+
+        businesses = {}
+        tags = defaultdict(list)
+        words = defaultdict(lambda: defaultdict(set))
+
+        for pk, name, key, status, deleted_at in Business.objects.values_list(
+            "id", "name", "name_key", "status", "deleted_at"
+        ):
+            businesses[pk] = (name, key, status, deleted_at is not None)
+            words[key][name].add(pk)
+
+        for pk, tag, key in Business.tags.through.objects.values_list(
+            "business_id", "tag__name", "tag__name_key"
+        ):
+            tags[pk].append(key)
+            words[key][tag].add(pk)
+
+        tree = BKTree(textdistance.levenshtein.distance)
+        for word in words:
+            tree.add(word)
+
+        self._businesses = businesses
+        self._tags = dict(tags)
+        self._words = {k: dict(v) for k, v in words.items()}
+        self._tree = tree
+        logger.debug("Fuzzy index built with %s words", len(words))
+
+    def _is_visible(self, pk, status, exclude_deleted):
+        _, _, business_status, is_deleted = self._businesses[pk]
+        if exclude_deleted and is_deleted:
+            return False
+        return status is None or business_status == status
+
+    def search(
+        self, query, distance, limit, status=None, exclude_deleted=False
+    ):
+        """
+        Words (business names or tag names) whose normalized Levenshtein
+        distance to `query` is below `distance`, plus the names of the
+        businesses whose name or tags contain `query`, closest first.
+        Comparisons ignore case and accents. Substring matches are only checked on the businesses that share
+        every trigram of `query` according to `trigram_index`.
+        """
+        self._ensure_fresh()
+        keyword = fold(query)
+        matches = set()
+
+        for word in self._tree.search(keyword, _max_radius(keyword, distance)):
+            if (
+                textdistance.levenshtein.normalized_distance(word, keyword)
+                >= distance
+            ):
+                continue
+            for original, pks in self._words[word].items():
+                if any(
+                    self._is_visible(pk, status, exclude_deleted) for pk in pks
+                ):
+                    matches.add(original)
+
+        for pk in trigram_index.candidates(keyword, ("name", "tag")):
+            if pk not in self._businesses:
+                continue
+            name, key = self._businesses[pk][:2]
+            if name in matches or not self._is_visible(
+                pk, status, exclude_deleted
+            ):
+                continue
+            if keyword in key or any(
+                keyword in t for t in self._tags.get(pk, ())
+            ):
+                matches.add(name)
+
+        return sorted(
+            matches,
+            key=lambda w: (
+                textdistance.levenshtein.normalized_distance(fold(w), keyword),
+                w,
+            ),
+        )[:limit]
+
+
+def _max_radius(keyword, distance):
+    """
+    Largest absolute edit distance a word can have while its normalized
+    distance to `keyword` stays below `distance`. Words longer than
+    len(keyword) / (1 - distance) can never match since their length
+    difference alone exceeds the threshold.
+    """
+    if distance >= 1:
+        return float("inf")
+    longest = len(keyword) / (1 - distance)
+    return int(distance * max(len(keyword), longest))
+
+
+def fold(text):
+    """Lower-case `text` and strip its accents: "Montréal" -> "montreal"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def trigrams(text):
+    """
+    Folded character trigrams of `text`. Text shorter than three
+    characters is kept whole so that it can still be found by
+    `TrigramIndex.candidates`.
+    """
+    text = fold(text)
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def business_texts(business, tag_names):
+    """(field, text) pairs indexed for a business, see BusinessTrigram."""
+    yield "name", business.name
+    for tag in tag_names:
+        yield "tag", tag
+    for field in TRANSLATED_TEXT_FIELDS:
+        for code, _ in settings.LANGUAGES:
+            text = getattr(business, build_localized_fieldname(field, code))
+            yield "text", text or ""
+
+
+def business_trigrams(business, tag_names):
+    return {
+        (field, gram)
+        for field, text in business_texts(business, tag_names)
+        for gram in trigrams(text)
+    }
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigram to business ids, persisted in the
+    BusinessTrigram table and mirrored in memory. A string can only
+    contain `term` if it contains every trigram of `term`, so the
+    intersection of the posting lists is a small superset of the
+    businesses that match and callers only need to check those.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        # field -> trigram -> set of business ids
+        self._postings = {}
+
+    def invalidate(self):
+        # Once committed, or other processes would reload the old rows
+        transaction.on_commit(lambda: bump_generation(TRIGRAM_INDEX))
+
+    def _ensure_fresh(self):
+        generation = get_generation(TRIGRAM_INDEX)
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._load()
+                self._generation = generation
+
+    def _load(self):
+        from backend.models import BusinessTrigram
+
+        postings = defaultdict(lambda: defaultdict(set))
+        for field, gram, pk in BusinessTrigram.objects.values_list(
+            "field", "trigram", "business_id"
+        ).iterator():
+            postings[field][gram].add(pk)
+        self._postings = postings
+        logger.debug("Trigram index loaded")
+
+    def candidates(self, term, fields):
+        """Ids of the businesses that may contain `term` in `fields`."""
+        self._ensure_fresh()
+        term = fold(term)
+        postings = [self._postings[f] for f in fields if f in self._postings]
+
+        if len(term) < 3:
+            ids = set()
+            for field_postings in postings:
+                for gram, pks in field_postings.items():
+                    if term in gram:
+                        ids |= pks
+            return ids
+
+        lists = sorted(
+            (
+                set().union(*(p.get(gram, ()) for p in postings))
+                for gram in trigrams(term)
+            ),
+            key=len,
+        )
+        ids = lists[0]
+        for pks in lists[1:]:
+            if not ids:
+                break
+            ids = ids & pks
+        return ids
+
+    def reindex(self, business_ids):
+        """
+        Recompute the trigrams of the given businesses, store them and,
+        once the transaction commits, patch the in-memory postings of this
+        process. Other processes reload the whole table on their next
+        lookup after that.
+        """
+        from backend.models import Business, BusinessTrigram
+
+        business_ids = set(business_ids)
+        if not business_ids:
+            return
+
+        new_rows = set()
+        for business in Business.objects.filter(
+            pk__in=business_ids
+        ).prefetch_related("tags"):
+            tag_names = [t.name for t in business.tags.all()]
+            for field, gram in business_trigrams(business, tag_names):
+                new_rows.add((field, gram, business.pk))
+
+        stored = BusinessTrigram.objects.filter(business_id__in=business_ids)
+        with transaction.atomic():
+            old_rows = set(
+                stored.values_list("field", "trigram", "business_id")
+            )
+            stored.delete()
+            BusinessTrigram.objects.bulk_create(
+                BusinessTrigram(field=f, trigram=g, business_id=pk)
+                for f, g, pk in new_rows
+            )
+
+        transaction.on_commit(lambda: self._patch(old_rows, new_rows))
+
+    def _patch(self, old_rows, new_rows):
+        self._ensure_fresh()
+        with self._lock:
+            for field, gram, pk in old_rows - new_rows:
+                self._postings[field][gram].discard(pk)
+            for field, gram, pk in new_rows - old_rows:
+                self._postings[field][gram].add(pk)
+            generation = bump_generation(TRIGRAM_INDEX)
+            if generation == self._generation + 1:
+                self._generation = generation
+
+
+fuzzy_index = FuzzyIndex()
+trigram_index = TrigramIndex()
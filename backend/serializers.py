@@ -1,7 +1,18 @@
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.db.models import prefetch_related_objects
+from django.utils.translation import get_language
 from rest_framework import serializers
 from django.utils.translation import gettext as _
 
+from backend.cache import (
+    get_generation,
+    versioned_key,
+    BUSINESS_FRAGMENTS,
+    CATEGORY_TREE,
+    FRAGMENT_CACHE_TIMEOUT,
+)
 from backend.models import (
     Category,
     Business,
@@ -13,6 +24,7 @@ from backend.models import (
     PaymentType,
     BusinessSuggestion,
 )
+from backend.renderers import EncodedDict
 from users.models import CustomUser
 
 
@@ -42,6 +54,41 @@ class CategorySerializer(serializers.ModelSerializer):
     children = RecursiveField(many=True, read_only=True)
 
 
+class CountedCategorySerializer(CategorySerializer):
+    """
+    Category with the number of accepted businesses of its subtree, for
+    the category endpoints. Businesses nest the plain CategorySerializer,
+    so their representations do not change with the counters.
+    """
+
+    class Meta(CategorySerializer.Meta):
+        fields = ["id", "name", "slug", "business_count", "children"]
+
+
+def serialize_category_tree(categories):
+    """
+    Nest flat category rows (dicts with id, name, slug, business_count and
+    parent_id) the way CountedCategorySerializer does, without a children
+    query per node.
+    Children keep the order of `categories`.
+    """
+    nodes = {}
+    children = {}
+    for c in categories:
+        nodes[c["id"]] = {
+            "id": c["id"],
+            "name": c["name"],
+            "slug": c["slug"],
+            "business_count": c["business_count"],
+            "children": children.setdefault(c["id"], []),
+        }
+    roots = []
+    for c in categories:
+        siblings = children.get(c["parent_id"], roots)
+        siblings.append(nodes[c["id"]])
+    return roots
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -63,7 +110,14 @@ class PhoneSerializer(serializers.ModelSerializer):
 class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
-        exclude = ["business", "created_at", "deleted_at", "updated_at"]
+        exclude = [
+            "business",
+            "city_key",
+            "geohash",
+            "created_at",
+            "deleted_at",
+            "updated_at",
+        ]
 
 
 class SocialLinkSerializer(serializers.ModelSerializer):
@@ -80,7 +134,157 @@ class OpeningHourSerializer(serializers.ModelSerializer):
         exclude = ["business", "created_at", "deleted_at", "updated_at"]
 
 
-class BusinessSerializer(serializers.ModelSerializer):
+def fragment_key(version, pk, updated_at):
+    """
+    Cache key of the serialized business. Writes to a business or to its
+    own rows move `updated_at`, writes to shared rows (categories, tags,
+    payment types) move `version`, see `backend.signals`.
+    """
+    return ":".join(
+        [
+            "backend",
+            BUSINESS_FRAGMENTS,
+            str(version),
+            str(pk),
+            updated_at.isoformat(),
+            get_language(),
+        ]
+    )
+
+
+def cached_fragments(items, render):
+    """
+    Serialized businesses from the fragment cache. `items` are (pk,
+    updated_at, item) and `render` serializes, in one go, the list of
+    items missing from the cache. Fragments are stored with their JSON
+    encoding, see `EncodedDict`.
+    """
+    version = get_generation(BUSINESS_FRAGMENTS)
+    keys = [
+        fragment_key(version, pk, updated_at) for pk, updated_at, _ in items
+    ]
+    fragments = cache.get_many(keys)
+
+    misses = [(k, i[2]) for k, i in zip(keys, items) if k not in fragments]
+    if misses:
+        missed_keys, missed_items = zip(*misses)
+        rendered = {
+            key: EncodedDict.encode(fragment)
+            for key, fragment in zip(missed_keys, render(list(missed_items)))
+        }
+        cache.set_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(rendered)
+
+    return [fragments[key] for key in keys]
+
+
+def parse_field_selection(fields, expand=None):
+    """
+    Fields picked by the `fields` and `expand` query parameters, e.g.
+    "id,name,category.name" and "addresses", as {"id": None, "name": None,
+    "category": {"name": None}, "addresses": None}, None selecting the
+    whole field. `expand` adds relations to `fields`. None when `fields`
+    is not given, which selects everything.
+    """
+    if not fields:
+        return None
+    selection = {}
+    for path in f"{fields},{expand or ''}".split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = selection
+        *parents, leaf = path.split(".")
+        for name in parents:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[leaf] = None
+    return selection
+
+
+def prune_fields(serializer, selection, prefix=""):
+    """Drop the fields of `serializer` (and nested ones) not selected."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    fields = getattr(serializer, "fields", None)
+    if fields is None:
+        raise serializers.ValidationError(
+            {"fields": _("%(field)s has no fields") % {"field": prefix[:-1]}}
+        )
+    unknown = [prefix + name for name in selection if name not in fields]
+    if unknown:
+        raise serializers.ValidationError(
+            {
+                "fields": _("Unknown fields: %(fields)s")
+                % {"fields": ", ".join(unknown)}
+            }
+        )
+    for name in list(fields):
+        if name not in selection:
+            fields.pop(name)
+        elif selection[name] is not None:
+            prune_fields(fields[name], selection[name], f"{prefix}{name}.")
+
+
+class SparseFieldsMixin:
+    """
+    Serializer taking a `fields` selection, see `parse_field_selection`,
+    that restricts its representation. `prefetch_lookups` maps fields to
+    the relations they render so that the ones left out are not loaded.
+    """
+
+    prefetch_lookups = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selection = fields
+        if fields is not None:
+            prune_fields(self, fields)
+
+    def get_prefetch_lookups(self):
+        return [
+            lookup
+            for name, lookup in self.prefetch_lookups.items()
+            if name in self.fields
+        ]
+
+
+class PrefetchListSerializer(serializers.ListSerializer):
+    """Prefetch the relations rendered by the child for the whole list."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        prefetch_related_objects(data, *self.child.get_prefetch_lookups())
+        return super().to_representation(data)
+
+
+class FragmentCacheListSerializer(serializers.ListSerializer):
+    """
+    Assemble a list of businesses from the fragment cache. Only the
+    businesses missing from it get their relations loaded and are
+    serialized. Partial representations (see `BusinessSerializer`) are
+    not cached.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        if self.child.selection is not None:
+            return self.render_misses(list(data))
+        return cached_fragments(
+            [(i.pk, i.updated_at, i) for i in data], self.render_misses
+        )
+
+    def render_misses(self, instances):
+        prefetch_related_objects(instances, *self.child.get_prefetch_lookups())
+        return [self.child.render_fragment(i) for i in instances]
+
+
+class BusinessSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     payment_types = serializers.StringRelatedField(read_only=True, many=True)
     phones = PhoneSerializer(read_only=True, many=True)
@@ -117,6 +321,133 @@ class BusinessSerializer(serializers.ModelSerializer):
             "updated_at",
             "payment_types",
         ]
+        list_serializer_class = FragmentCacheListSerializer
+
+    # Relations rendered above by field, loaded in a fixed number of
+    # queries. The nested category renders its subtree, so its children
+    # are prefetched down to Category.MAX_LEVEL.
+    prefetch_lookups = {
+        "category": "category" + "__children" * Category.MAX_LEVEL,
+        "tags": "tags",
+        "payment_types": "payment_types",
+        "phones": "phones",
+        "social_links": "social_links",
+        "addresses": "addresses",
+        "business_hours": "opening_hours",
+    }
+
+    def get_prefetch_lookups(self):
+        lookups = super().get_prefetch_lookups()
+        category = self.fields.get("category")
+        if category is not None and "children" not in category.fields:
+            # Only the category itself, which is selected with the business
+            lookups.remove(self.prefetch_lookups["category"])
+        return lookups
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        The other relations are only prefetched for the businesses missing
+        from the fragment cache, see `FragmentCacheListSerializer`.
+        """
+        return queryset.select_related("category")
+
+    def to_representation(self, instance):
+        if self.selection is not None:
+            prefetch_related_objects([instance], *self.get_prefetch_lookups())
+            return self.render_fragment(instance)
+        key = fragment_key(
+            get_generation(BUSINESS_FRAGMENTS),
+            instance.pk,
+            instance.updated_at,
+        )
+        fragment = cache.get(key)
+        if fragment is None:
+            prefetch_related_objects([instance], *self.get_prefetch_lookups())
+            fragment = EncodedDict.encode(self.render_fragment(instance))
+            cache.set(key, fragment, FRAGMENT_CACHE_TIMEOUT)
+        return fragment
+
+    def render_fragment(self, instance):
+        return super().to_representation(instance)
+
+
+def read_category_paths():
+    """
+    str() of every category ("Food>Restaurant") by id, cached until a
+    category is written.
+    """
+    key = versioned_key(CATEGORY_TREE, "paths")
+    paths = cache.get(key)
+    if paths is not None:
+        return paths
+
+    categories = {
+        pk: (name, parent)
+        for pk, name, parent in Category.objects.values_list(
+            "id", "name", "parent"
+        )
+    }
+    paths = {}
+    for pk in categories:
+        names = []
+        ancestor = pk
+        while ancestor in categories:
+            name, ancestor = categories[ancestor]
+            names.append(name)
+        paths[pk] = ">".join(reversed(names))
+    cache.set(key, paths, None)
+    return paths
+
+
+class CompactBusinessSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
+    """
+    Listing representation of a business: its category as a path
+    ("Food>Restaurant"), the names of its tags and the city of its first
+    address instead of nested objects.
+    """
+
+    category = serializers.SerializerMethodField()
+    tags = serializers.StringRelatedField(read_only=True, many=True)
+    city = serializers.SerializerMethodField()
+    slug = serializers.SlugField(read_only=True)
+
+    class Meta:
+        model = Business
+        fields = [
+            "id",
+            "name",
+            "slug",
+            "slogan",
+            "status",
+            "category",
+            "tags",
+            "city",
+        ]
+        list_serializer_class = PrefetchListSerializer
+
+    prefetch_lookups = {"tags": "tags", "city": "addresses"}
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # The category is rendered from `read_category_paths`
+        return queryset
+
+    def get_category(self, business):
+        # str(category) would query its ancestors for every business
+        if business.category_id is None:
+            return None
+        return read_category_paths().get(business.category_id)
+
+    def get_city(self, business):
+        addresses = sorted(business.addresses.all(), key=lambda a: a.pk)
+        return addresses[0].city if addresses else None
+
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], *self.get_prefetch_lookups())
+        return super().to_representation(instance)
 
 
 class BusinessCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,388 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    pre_save,
+    post_save,
+    post_delete,
+    pre_delete,
+    m2m_changed,
+)
+from django.db.models import Q
+from django.db.models.functions import Substr
+from django.dispatch import receiver
+from django.utils import timezone
+
+from backend.cache import (
+    bump_generation,
+    count_generation,
+    BUSINESS_FRAGMENTS,
+    BUSINESS_RESPONSES,
+    CATEGORY_RESPONSES,
+    CATEGORY_TREE,
+    TAG_RESPONSES,
+)
+from backend.models import (
+    Address,
+    Business,
+    BusinessOpenHour,
+    Category,
+    OpeningHour,
+    PaymentType,
+    Phone,
+    SocialLink,
+    Tag,
+)
+from backend import fulltext
+from backend.counters import (
+    counted_category,
+    move_business_count,
+    previous_counted_category,
+    rebuild_business_counts,
+)
+from backend.facets import facet_index
+from backend.geo import geocode_postal_code, geohash_encode
+from backend.hours import open_hours, opening_slots
+from backend.search import fold, fuzzy_index, trigram_index
+
+# Model -> (field, folded copy of the field)
+FOLDED_FIELDS = {
+    Business: ("name", "name_key"),
+    Tag: ("name", "name_key"),
+    Address: ("city", "city_key"),
+}
+
+
+@receiver(pre_save, sender=Business)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Address)
+def fold_keys(sender, instance, **kwargs):
+    # pre_save rather than save() so that fixtures (raw saves) get them too
+    field, key = FOLDED_FIELDS[sender]
+    setattr(instance, key, fold(getattr(instance, field)))
+
+
+@receiver(pre_save, sender=Address)
+def geocode_address(sender, instance, **kwargs):
+    instance.latitude, instance.longitude = geocode_postal_code(
+        instance.postal_code
+    )
+    instance.geohash = ""
+    if instance.latitude is not None:
+        instance.geohash = geohash_encode(
+            instance.latitude, instance.longitude
+        )
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Business.tags.through)
+def invalidate_fuzzy_index(sender, **kwargs):
+    fuzzy_index.invalidate()
+
+
+def reindex_businesses(business_ids):
+    business_ids = list(business_ids)
+    trigram_index.reindex(business_ids)
+    fulltext.reindex(business_ids)
+
+
+@receiver(post_save, sender=Business)
+def reindex_business_search(sender, instance, **kwargs):
+    reindex_businesses([instance.pk])
+
+
+@receiver(post_delete, sender=Business)
+def remove_business_from_search(sender, instance, **kwargs):
+    trigram_index.invalidate()
+    fulltext.get_search_backend().remove([instance.pk])
+
+
+@receiver(m2m_changed, sender=Business.tags.through)
+def reindex_tagged_business_search(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            reindex_businesses([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_business_ids = list(
+            instance.business_set.values_list("id", flat=True)
+        )
+    elif action == "post_clear":
+        reindex_businesses(instance._cleared_business_ids)
+    elif action in ("post_add", "post_remove"):
+        reindex_businesses(pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_businesses(sender, instance, **kwargs):
+    instance._tagged_business_ids = list(
+        instance.business_set.values_list("id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reindex_tag_search(sender, instance, **kwargs):
+    business_ids = getattr(instance, "_tagged_business_ids", None)
+    if business_ids is None:
+        business_ids = instance.business_set.values_list("id", flat=True)
+    reindex_businesses(business_ids)
+
+
+@receiver(post_delete, sender=Category)
+def detach_subcategories(sender, instance, **kwargs):
+    # Children of a deleted category become roots (SET_NULL), so their
+    # subtrees lose the deleted category's path as a prefix.
+    if not instance.path:
+        return
+    Category.objects.filter(path__startswith=instance.path).update(
+        path=Substr("path", len(instance.path) + 1)
+    )
+
+
+@receiver(post_save, sender=Category)
+def build_loaded_category_paths(sender, instance, raw, **kwargs):
+    # Category.save() builds the path, loaddata does not call it. The
+    # parent may only be loaded after its children, so rebuild them all.
+    if raw and Category.rebuild_paths():
+        rebuild_business_counts()
+
+
+@receiver(post_delete, sender=Category)
+def recount_detached_businesses(sender, instance, **kwargs):
+    # Businesses of the deleted category lost it (SET_NULL) with an
+    # update(), and its subtree lost its ancestors
+    rebuild_business_counts()
+
+
+@receiver(pre_save, sender=Business)
+def remember_counted_category(sender, instance, **kwargs):
+    # Business.save() and loaddata run the save in a transaction
+    instance._counted_category_id = None
+    if instance.pk is not None:
+        instance._counted_category_id = previous_counted_category(instance.pk)
+
+
+@receiver(post_save, sender=Business)
+def update_category_count(sender, instance, **kwargs):
+    move_business_count(
+        instance._counted_category_id,
+        counted_category(
+            instance.status, instance.category_id, instance.deleted_at
+        ),
+    )
+
+
+@receiver(post_delete, sender=Business)
+def remove_from_category_count(sender, instance, **kwargs):
+    move_business_count(
+        counted_category(
+            instance.status, instance.category_id, instance.deleted_at
+        ),
+        None,
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    transaction.on_commit(lambda: bump_generation(CATEGORY_TREE))
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Business.tags.through)
+@receiver(m2m_changed, sender=Business.payment_types.through)
+@receiver(post_save, sender=OpeningHour)
+@receiver(post_delete, sender=OpeningHour)
+def invalidate_business_counts(sender, **kwargs):
+    transaction.on_commit(lambda: bump_generation(count_generation(Business)))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_counts(sender, **kwargs):
+    transaction.on_commit(lambda: bump_generation(count_generation(Tag)))
+
+
+def touch_businesses(business_ids):
+    # update() sends no signal, so this does not reindex the businesses
+    now = timezone.now()
+    Business.objects.filter(pk__in=business_ids).update(updated_at=now)
+    return now
+
+
+@receiver(post_save, sender=Phone)
+@receiver(post_delete, sender=Phone)
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+@receiver(post_save, sender=SocialLink)
+@receiver(post_delete, sender=SocialLink)
+@receiver(post_save, sender=OpeningHour)
+@receiver(post_delete, sender=OpeningHour)
+def touch_business_of_row(sender, instance, **kwargs):
+    # Rows owned by a business are part of its serialized fragment
+    if instance.business_id is not None:
+        touch_businesses([instance.business_id])
+
+
+def businesses_rendering(sender, instance):
+    """Businesses whose representation includes a lookup row."""
+    if sender is not Category:
+        return instance.business_set.all()
+    # A business renders its category's subtree and, in the compact
+    # representation, its ancestors
+    rendered = Q(category_id__in=Category.path_ids(instance.path))
+    rendered |= Q(category_id=instance.pk)
+    if instance.path:
+        rendered |= Q(category__path__startswith=instance.path)
+    return Business.objects.filter(rendered)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=PaymentType)
+@receiver(pre_delete, sender=PaymentType)
+def touch_businesses_of_lookup(sender, instance, **kwargs):
+    # Renames and deletions of shared rows are changes of the businesses
+    # rendering them for the changes feed. On delete, before the links
+    # are gone, in the deletion's transaction.
+    if kwargs.get("created") or kwargs.get("raw"):
+        return
+    touch_businesses(businesses_rendering(sender, instance).values("pk"))
+
+
+@receiver(post_save, sender=OpeningHour)
+@receiver(post_delete, sender=OpeningHour)
+def rebuild_opening_slots(sender, instance, **kwargs):
+    opening_hours = OpeningHour.objects.filter(
+        business_id=instance.business_id
+    ).values_list("day", "opening_time", "closing_time", "closed")
+    slots = opening_slots(opening_hours)
+    Business.objects.filter(pk=instance.business_id).update(
+        opening_slots=slots
+    )
+    BusinessOpenHour.objects.filter(business_id=instance.business_id).delete()
+    BusinessOpenHour.objects.bulk_create(
+        BusinessOpenHour(
+            business_id=instance.business_id, hour=hour, quarters=quarters
+        )
+        for hour, quarters in open_hours(slots)
+    )
+
+
+@receiver(m2m_changed, sender=Business.tags.through)
+@receiver(m2m_changed, sender=Business.payment_types.through)
+def touch_linked_businesses(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            instance.updated_at = touch_businesses([instance.pk])
+    elif action == "pre_clear":
+        instance._linked_business_ids = list(
+            instance.business_set.values_list("id", flat=True)
+        )
+    elif action == "post_clear":
+        touch_businesses(instance._linked_business_ids)
+    elif action in ("post_add", "post_remove"):
+        touch_businesses(pk_set)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=PaymentType)
+@receiver(post_delete, sender=PaymentType)
+def invalidate_business_fragments(sender, **kwargs):
+    # Shared rows are rendered by many businesses without touching them
+    transaction.on_commit(lambda: bump_generation(BUSINESS_FRAGMENTS))
+
+
+@receiver(m2m_changed, sender=Business.tags.through)
+@receiver(m2m_changed, sender=Business.payment_types.through)
+def update_facet_links(sender, instance, action, reverse, pk_set, **kwargs):
+    facet = "tags" if sender is Business.tags.through else "payment_types"
+    if action in ("post_add", "post_remove"):
+        if reverse:
+            business_ids, value_ids = pk_set, [instance.pk]
+        else:
+            business_ids, value_ids = [instance.pk], pk_set
+        facet_index.link(
+            facet, business_ids, value_ids, linked=action == "post_add"
+        )
+    elif action == "post_clear":
+        if reverse:
+            facet_index.unlink_value(facet, instance.pk)
+        else:
+            facet_index.unlink_business(facet, instance.pk)
+
+
+@receiver(post_save, sender=Business)
+def update_facet_category(sender, instance, **kwargs):
+    facet_index.set_category(instance.pk, instance.category_id)
+
+
+@receiver(post_delete, sender=Business)
+def remove_facet_business(sender, instance, **kwargs):
+    facet_index.remove_business(instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=PaymentType)
+def remove_facet_value(sender, instance, **kwargs):
+    facet = "tags" if sender is Tag else "payment_types"
+    facet_index.unlink_value(facet, instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_facet_index(sender, **kwargs):
+    # Moving a category moves its whole subtree
+    facet_index.invalidate()
+
+
+# Models rendered by each group of cached responses
+RESPONSE_DEPENDENCIES = {
+    BUSINESS_RESPONSES: [
+        Business,
+        Category,
+        Tag,
+        PaymentType,
+        Phone,
+        Address,
+        SocialLink,
+        OpeningHour,
+        Business.tags.through,
+        Business.payment_types.through,
+    ],
+    CATEGORY_RESPONSES: [Category],
+    TAG_RESPONSES: [Tag],
+}
+
+
+def invalidate_responses(sender, **kwargs):
+    for generation, models in RESPONSE_DEPENDENCIES.items():
+        if sender in models:
+            transaction.on_commit(partial(bump_generation, generation))
+
+
+for model in {m for ms in RESPONSE_DEPENDENCIES.values() for m in ms}:
+    if model._meta.auto_created:
+        m2m_changed.connect(invalidate_responses, sender=model)
+    else:
+        post_save.connect(invalidate_responses, sender=model)
+        post_delete.connect(invalidate_responses, sender=model)
@@ -0,0 +1,86 @@
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+
+def encode_token(updated_at, pk):
+    """
+    Opaque position of a business in the (updated_at, id) order. Tokens
+    only ever move forward, and only up to writes older than the safety
+    window, see `changes`.
+    """
+    position = f"{updated_at.isoformat()},{pk}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_token(since):
+    """
+    (updated_at, id) position from a token returned by `changes`, or
+    from an ISO 8601 timestamp to start from.
+    """
+    timestamp = parse_datetime(since)
+    pk = 0
+    if timestamp is None:
+        try:
+            position = base64.urlsafe_b64decode(since.encode()).decode()
+            iso, pk = position.split(",")
+            timestamp, pk = parse_datetime(iso), int(pk)
+        except (binascii.Error, ValueError):
+            timestamp = None
+        if timestamp is None:
+            raise ValueError(f"Invalid sync token: {since}")
+    if is_naive(timestamp):
+        timestamp = make_aware(timestamp)
+    return timestamp, pk
+
+
+def changes(queryset, status, since, limit):
+    """
+    Businesses written after `since` in (updated_at, id) order as
+    (upserted, deleted ids, sync token, has more). Businesses that were
+    soft-deleted or no longer have `status` are tombstones: the client
+    drops them from its copy.
+
+    `updated_at` is stamped before the write commits, so a write may
+    become visible behind a position already returned. The token thus
+    only moves up to the last business older than SYNC_SAFETY_WINDOW
+    (the horizon): more recent ones are returned right away and again on
+    the next call, until they are older than the horizon. Upserts and
+    deletions are idempotent, so the client deduplicates them by id.
+    """
+    horizon = timezone.now() - timedelta(
+        seconds=getattr(settings, "SYNC_SAFETY_WINDOW", 0)
+    )
+    queryset = queryset.order_by("updated_at", "id")
+    if since is not None:
+        updated_at, pk = decode_token(since)
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+        )
+    businesses = list(queryset[: limit + 1])
+    has_more = len(businesses) > limit
+    businesses = businesses[:limit]
+
+    upserted = []
+    deleted = []
+    for business in businesses:
+        if business.deleted_at is None and business.status == status:
+            upserted.append(business)
+        else:
+            deleted.append(business.pk)
+
+    settled = [b for b in businesses if b.updated_at <= horizon]
+    if settled:
+        last = settled[-1]
+        since = encode_token(last.updated_at, last.pk)
+    elif since is None:
+        since = encode_token(horizon, 0)
+    # Past the horizon, the rest is resent from the token on the next call
+    has_more = has_more and len(settled) == len(businesses)
+    return upserted, deleted, since, has_more
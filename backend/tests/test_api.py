@@ -5,7 +5,7 @@ from rest_framework.utils import json
 
 from users.models import CustomUser
 from ..models import Category
-from ..serializers import CategorySerializer
+from ..serializers import CountedCategorySerializer
 
 
 class TestCategoryEndpoint(APITestCase):
@@ -22,7 +22,7 @@ class TestCategoryEndpoint(APITestCase):
     def test_get_all(self):
         response = self.client.get(self.url)
         categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
+        serializer = CountedCategorySerializer(categories, many=True)
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
@@ -36,6 +36,7 @@ class TestCategoryEndpoint(APITestCase):
                 "id": 1,
                 "name": "Restaurant",
                 "slug": "restaurant",
+                "business_count": 0,
                 "children": [],
             },
         )
@@ -48,7 +49,13 @@ class TestCategoryEndpoint(APITestCase):
         )
         self.assertEqual(
             json.loads(response.content),
-            {"id": 1, "name": "jojo", "slug": "jojo", "children": []},
+            {
+                "id": 1,
+                "name": "jojo",
+                "slug": "jojo",
+                "business_count": 0,
+                "children": [],
+            },
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual("jojo", Category.objects.get(name="jojo").name)
@@ -0,0 +1,112 @@
+from unittest import TestCase
+
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from main.utils import reverse_querystring
+from users.models import CustomUser
+from .utils import committed
+from ..models import Business, Tag
+from ..search import BKTree
+
+
+class TestBusinessAutoCompleteEndpoint(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        with committed():
+            self.tag = Tag.objects.create(name="coiffure")
+            self.business = Business.objects.create(
+                name="gracia afrika", status="accepted"
+            )
+            self.business.tags.add(self.tag)
+            Business.objects.create(name="restaurant2", status="accepted")
+            Business.objects.create(name="gracia afrikaa", status="pending")
+
+    def get(self, **query_kwargs):
+        return self.client.get(
+            reverse_querystring(
+                "business-autocomplete", query_kwargs=query_kwargs
+            )
+        )
+
+    def test_missing_search(self):
+        response = self.client.get(reverse("business-autocomplete"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_parameters(self):
+        for query_kwargs in [
+            {"distance": "far"},
+            {"distance": "nan"},
+            {"distance": "-1"},
+            {"limit": "ten"},
+        ]:
+            response = self.get(querySearch="gracia", **query_kwargs)
+            self.assertEqual(
+                response.status_code,
+                status.HTTP_400_BAD_REQUEST,
+                query_kwargs,
+            )
+
+    def test_limit_clamped(self):
+        response = self.get(querySearch="gracia afrik", limit="0")
+        self.assertEqual(response.data, ["gracia afrika"])
+        response = self.get(querySearch="gracia afrik", limit="100000")
+        self.assertEqual(response.data, ["gracia afrika"])
+
+    def test_fuzzy_name_and_tag(self):
+        response = self.get(querySearch="gracia afrik")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, ["gracia afrika"])
+
+        response = self.get(querySearch="coifure")
+        self.assertEqual(response.data, ["coiffure"])
+
+    def test_substring_match(self):
+        response = self.get(querySearch="coif")
+        self.assertEqual(response.data, ["gracia afrika"])
+
+    def test_accents_and_case(self):
+        with committed():
+            Business.objects.create(name="Café Créole", status="accepted")
+        response = self.get(querySearch="cafe creol")
+        self.assertEqual(response.data, ["Café Créole"])
+
+        response = self.get(querySearch="CRÉO")
+        self.assertEqual(response.data, ["Café Créole"])
+
+    def test_distance_and_limit(self):
+        response = self.get(querySearch="restaurant", distance=0.01)
+        self.assertEqual(response.data, ["restaurant2"])
+
+        response = self.get(querySearch="a", distance=1.1, limit=1)
+        self.assertEqual(len(response.data), 1)
+
+    def test_index_refreshed_on_save(self):
+        with committed():
+            Business.objects.create(name="boulangerie", status="accepted")
+        response = self.get(querySearch="boulangeri")
+        self.assertEqual(response.data, ["boulangerie"])
+
+        with committed():
+            self.tag.name = "barbier"
+            self.tag.save()
+        response = self.get(querySearch="coifure")
+        self.assertEqual(response.data, [])
+
+
+class TestBKTree(TestCase):
+    def test_search(self):
+        tree = BKTree(
+            lambda a, b: abs(len(a) - len(b))
+            + sum(x != y for x, y in zip(a, b))
+        )
+        for word in ["book", "books", "cake", "boo", "cape", "boon"]:
+            tree.add(word)
+        self.assertEqual(
+            sorted(tree.search("book", 1)), ["boo", "book", "books", "boon"]
+        )
@@ -1,13 +1,21 @@
 from datetime import datetime
 from json import loads, dumps
+from unittest import mock
 
-from django.utils import timezone
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone, translation
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
 from main.utils import reverse_querystring
 from users.models import CustomUser
+from .utils import committed
 from ..models import (
     Business,
     Category,
@@ -17,8 +25,19 @@ from ..models import (
     Phone,
     Address,
     OpeningHour,
+    PaymentType,
+)
+from ..fast_serializers import (
+    FastBusinessListSerializer,
+    FastCompactBusinessListSerializer,
+    FastTagListSerializer,
+)
+from ..search import trigram_index
+from ..serializers import (
+    BusinessSerializer,
+    CompactBusinessSerializer,
+    TagSerializer,
 )
-from ..serializers import BusinessSerializer
 
 
 class TestBusinessEndpoint(APITestCase):
@@ -26,6 +45,7 @@ class TestBusinessEndpoint(APITestCase):
     maxDiff = None
 
     def setUp(self):
+        cache.clear()
         self.user = CustomUser.objects.create_user(
             email="jojo@mail.com", password="bizzare"
         )
@@ -123,6 +143,8 @@ class TestBusinessEndpoint(APITestCase):
                         "direction": "",
                         "id": 1,
                         "postal_code": "",
+                        "latitude": None,
+                        "longitude": None,
                         "province": "qc",
                         "street_name": "Wall Street",
                         "street_number": 123,
@@ -228,6 +250,784 @@ class TestBusinessEndpoint(APITestCase):
             to_dict(response.data["items"][0]),
         )
 
+    def test_search_tag_and_slogan(self):
+        self.business3.slogan = "Cuisine haïtienne"
+        self.business3.save()
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"querySearch": "africa"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["gracia afrika"]
+        )
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"querySearch": "haïti"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["business3"]
+        )
+
+    @override_settings(SEARCH_BACKEND="backend.fulltext.TrigramSearchBackend")
+    def test_search_trigrams(self):
+        # Generations restart with the cache: forget other tests' index
+        trigram_index._generation = None
+        url = reverse_querystring(
+            "business-list", query_kwargs={"querySearch": "afrika"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["gracia afrika"]
+        )
+
+        # Above MAX_FILTER_IDS candidates, only with the contains lookups
+        cache.clear()
+        with override_settings(MAX_FILTER_IDS=0):
+            response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["gracia afrika"]
+        )
+
+    def test_search_index_follows_tags(self):
+        self.tag2.name = "creole"
+        self.tag2.save()
+        self.business3.tags.add(self.tag2)
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"querySearch": "creo"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            sorted(b["name"] for b in response.data["items"]),
+            ["business3", "restaurant2"],
+        )
+
+        with committed():
+            self.business3.tags.remove(self.tag2)
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["restaurant2"]
+        )
+
+    def test_search_ranked(self):
+        self.business3.description = "Cuisine créole et africaine"
+        self.business3.save()
+        self.business2.name = "Créole express"
+        self.business2.save()
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"querySearch": "CREOLE"}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]],
+            ["Créole express", "business3"],
+        )
+        self.assertFalse(
+            any("LIKE" in q["sql"] for q in queries.captured_queries)
+        )
+
+    def test_filter_location(self):
+        Address.objects.create(
+            street_number="1",
+            street_name="Sainte-Catherine",
+            city="Montréal",
+            business=self.business,
+        )
+        for location in ("montreal", "MONTRÉAL", "Mont"):
+            url = reverse_querystring(
+                "business-list", query_kwargs={"location": location}
+            )
+            response = self.client.get(url, format="json")
+            self.assertEqual(
+                sorted(b["name"] for b in response.data["items"]),
+                ["business3", "gracia afrika"],
+            )
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"location": "real"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.data["items"], [])
+
+    def test_filter_near(self):
+        for business, postal_code in [
+            (self.business, "h2b 1v3"),
+            (self.business2, "J4J 2V6"),
+            (self.business3, "G1R 4P5"),
+        ]:
+            Address.objects.create(
+                street_number="1",
+                street_name="Sainte-Catherine",
+                postal_code=postal_code,
+                business=business,
+            )
+        self.assertEqual(
+            Address.objects.filter(business=self.business)
+            .values_list("latitude", "longitude")
+            .get(),
+            (45.5664, -73.647),
+        )
+
+        for radius, names in [
+            ("1", ["gracia afrika"]),
+            ("15", ["gracia afrika", "restaurant2"]),
+            ("250", ["business3", "gracia afrika", "restaurant2"]),
+        ]:
+            url = reverse_querystring(
+                "business-list",
+                query_kwargs={"near": "45.56,-73.65", "radius": radius},
+            )
+            response = self.client.get(url, format="json")
+            self.assertEqual(
+                sorted(b["name"] for b in response.data["items"]), names
+            )
+
+        for near, radius in [("45.56", "1"), ("91,0", "1"), ("45,-73", "0")]:
+            url = reverse_querystring(
+                "business-list", query_kwargs={"near": near, "radius": radius}
+            )
+            response = self.client.get(url, format="json")
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
+    def test_filter_nearest(self):
+        for business, postal_code in [
+            (self.business, "J4J 2V6"),
+            (self.business, "G1R 4P5"),
+            (self.business2, "H2B 1V3"),
+            (self.business3, "H3W 1B8"),
+        ]:
+            Address.objects.create(
+                street_number="1",
+                street_name="Sainte-Catherine",
+                postal_code=postal_code,
+                business=business,
+            )
+        query = {"near": "46.81,-71.22", "nearest": "3"}
+        url = reverse_querystring("business-list", query_kwargs=query)
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]],
+            ["gracia afrika", "restaurant2", "business3"],
+        )
+
+        sub_category = Category.objects.create(
+            name="African", parent=self.category
+        )
+        self.business3.category = sub_category
+        self.business3.save()
+        self.business3.tags.add(self.tag2)
+        for extra, names in [
+            ({"nearest": "1"}, ["gracia afrika"]),
+            ({"radius": "100"}, ["gracia afrika"]),
+            ({"tag": "Tag2"}, ["restaurant2", "business3"]),
+            ({"category": "african"}, ["business3"]),
+            # Searched businesses ranked as a subquery
+            ({"querySearch": "restaurant"}, ["restaurant2"]),
+        ]:
+            url = reverse_querystring(
+                "business-list", query_kwargs={**query, **extra}
+            )
+            response = self.client.get(url, format="json")
+            self.assertEqual(
+                [b["name"] for b in response.data["items"]], names
+            )
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={**query, "nearest": "1000"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_open_at(self):
+        # business3 opens on Mondays from 10 to 17; 2021-01-04 is a Monday
+        for open_at, names in [
+            ("2021-01-04T10:30", ["business3"]),
+            ("2021-01-04T15:30:00Z", ["business3"]),
+            ("2021-01-04T17:00", []),
+            ("2021-07-05T20:59:00+00:00", ["business3"]),
+        ]:
+            url = reverse_querystring(
+                "business-list", query_kwargs={"open_at": open_at}
+            )
+            response = self.client.get(url, format="json")
+            self.assertEqual(
+                [b["name"] for b in response.data["items"]], names
+            )
+
+        # Counted again when another business opens at that moment
+        url = reverse_querystring(
+            "business-list",
+            query_kwargs={"open_at": "2021-01-04T10:30", "page_size": 1},
+        )
+        self.client.get(url, format="json")
+        with committed():
+            OpeningHour.objects.create(
+                business=self.business2,
+                day=1,
+                opening_time=datetime(2020, 1, 1, 9, 0, 0),
+                closing_time=datetime(2020, 1, 1, 12, 0, 0),
+            )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.json()["items_count"], 2)
+        self.assertIsNotNone(response.json()["next"])
+
+        with committed():
+            OpeningHour.objects.filter(business=self.business2).delete()
+            self.business_hours.delete()
+        self.assertFalse(self.business3.open_hours.exists())
+        url = reverse_querystring(
+            "business-list", query_kwargs={"open_at": "2021-01-04T10:30"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.data["items"], [])
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"open_at": "monday"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_open_now(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"open_now": "1"}
+        )
+        for now, names in [
+            ("2021-01-04T15:30:00Z", ["business3"]),
+            # Same request, not served from the cache
+            ("2021-01-04T22:30:00Z", []),
+            # A week later, served from the cache
+            ("2021-01-11T15:30:00Z", ["business3"]),
+        ]:
+            with mock.patch(
+                "django.utils.timezone.now", return_value=parse_datetime(now)
+            ):
+                response = self.client.get(url, format="json")
+            self.assertEqual(
+                [b["name"] for b in response.json()["items"]], names
+            )
+
+        with committed():
+            self.business_hours.closing_time = datetime(2020, 1, 1, 10, 30)
+            self.business_hours.save()
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=parse_datetime("2021-01-04T15:30:00Z"),
+        ):
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.json()["items"], [])
+
+    def test_filter_category_subtree(self):
+        sub_category = Category.objects.create(
+            name="African", parent=self.category
+        )
+        self.business3.category = sub_category
+        self.business3.save()
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"category": "restaurant"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.data["items_count"], 3)
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"category": "african"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["business3"]
+        )
+
+    def test_cursor_pagination(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"cursor": "", "page_size": 2}
+        )
+        response = self.client.get(url, format="json")
+        self.assertNotIn("items_count", response.data)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]],
+            ["business3", "gracia afrika"],
+        )
+
+        response = self.client.get(response.data["next"], format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]], ["restaurant2"]
+        )
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(response.data["previous"], format="json")
+        self.assertEqual(
+            [b["name"] for b in response.data["items"]],
+            ["business3", "gracia afrika"],
+        )
+
+    def test_response_cached(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"page": 1, "page_size": 2}
+        )
+        response = self.client.get(url, format="json")
+        same_url = reverse_querystring(
+            "business-list", query_kwargs={"page_size": 2, "page": 1}
+        )
+        with self.assertNumQueries(0):
+            cached = self.client.get(same_url, format="json")
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["Content-Type"], "application/json")
+
+        # Pagination links are absolute
+        response = self.client.get(
+            url, format="json", HTTP_HOST="example.com", secure=True
+        )
+        self.assertTrue(
+            response.json()["next"].startswith("https://example.com/")
+        )
+
+    def test_response_invalidated(self):
+        detail_url = reverse("business-detail", kwargs={"pk": 3})
+        self.client.get(self.url, format="json")
+        self.client.get(detail_url, format="json")
+
+        with committed():
+            self.phone1.number = "514-666-6666"
+            self.phone1.save()
+        response = self.client.get(detail_url, format="json")
+        self.assertEqual(response.data["phones"][0]["number"], "514-666-6666")
+
+        with committed():
+            self.business.tags.remove(self.tag)
+        response = self.client.get(self.url, format="json")
+        self.assertEqual(response.data["items"][0]["tags"], [])
+
+        with committed():
+            self.category.name = "Cuisine"
+            self.category.save()
+        response = self.client.get(detail_url, format="json")
+        self.assertEqual(response.data["category"]["name"], "Cuisine")
+
+    def test_conditional_list(self):
+        response = self.client.get(self.url, format="json")
+        etag = response["ETag"]
+        # Rows leaving the list would not move it
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.url, format="json", HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        # Leaves the list without moving its max(updated_at)
+        with committed():
+            self.business.status = "pending"
+            self.business.save()
+        response = self.client.get(
+            self.url, format="json", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # Shared rows change the rendering without touching the businesses
+        etag = response["ETag"]
+        with committed():
+            self.category.name = "Cuisine"
+            self.category.save()
+        response = self.client.get(
+            self.url, format="json", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_conditional_detail(self):
+        detail_url = reverse("business-detail", kwargs={"pk": 3})
+        response = self.client.get(detail_url, format="json")
+        last_modified = response["Last-Modified"]
+
+        response = self.client.get(
+            detail_url, format="json", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["Last-Modified"], last_modified)
+
+        response = self.client.get(
+            reverse("business-detail", kwargs={"pk": 404}),
+            format="json",
+            HTTP_IF_NONE_MATCH="*",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestBusinessEndpointQueries(APITestCase):
+    """The number of queries must not depend on the number of items."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        root = Category.objects.create(name="Food")
+        category = Category.objects.create(name="Restaurant", parent=root)
+        Category.objects.create(name="African", parent=category)
+        tag = Tag.objects.create(name="africain")
+        payment_type = PaymentType.objects.create(name="cash")
+        for i in range(10):
+            business = Business.objects.create(
+                name=f"business{i}", category=root, status="accepted"
+            )
+            business.tags.add(tag)
+            business.payment_types.add(payment_type)
+            Phone.objects.create(
+                number="514-555-5555", type="tel", business=business
+            )
+            SocialLink.objects.create(
+                link="https://www.facebook.com/moi", business=business
+            )
+            Address.objects.create(
+                street_number="123",
+                street_name="Wall Street",
+                business=business,
+            )
+            OpeningHour.objects.create(business=business, day=1)
+
+    def test_list(self):
+        for page_size in (1, 10):
+            cache.clear()
+            url = reverse_querystring(
+                "business-list", query_kwargs={"page_size": page_size}
+            )
+            # Validators, COUNT, page, 6 relations and the categories
+            with self.assertNumQueries(10):
+                response = self.client.get(url, format="json")
+            self.assertEqual(len(response.data["items"]), page_size)
+
+    def test_list_count_cached(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"page_size": 2, "page": 1}
+        )
+        self.client.get(url, format="json")
+        url = reverse_querystring(
+            "business-list", query_kwargs={"page_size": 2, "page": 2}
+        )
+        # No COUNT, categories cached
+        with self.assertNumQueries(8):
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.data["items_count"], 10)
+
+        # COUNT and page, the businesses on it come from the fragment cache
+        with committed():
+            Business.objects.create(name="business10", status="accepted")
+        with self.assertNumQueries(2 + 1):
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.data["items_count"], 11)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=100)
+    def test_list_count_estimated(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"page_size": 2}
+        )
+        with mock.patch("backend.pagination.estimate_count", return_value=10):
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.data["items_count"], 10)
+        self.assertNotIn("estimated_items_count", response.data)
+
+        cache.clear()
+        with mock.patch(
+            "backend.pagination.estimate_count", return_value=1000
+        ):
+            response = self.client.get(url, format="json")
+        self.assertIsNone(response.data["items_count"])
+        self.assertEqual(response.data["estimated_items_count"], 1000)
+        self.assertEqual(response.data["total_pages"], 500)
+
+    def test_list_cursor(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"cursor": "", "page_size": 5}
+        )
+        # Same as the page number list minus the COUNT
+        with self.assertNumQueries(9):
+            response = self.client.get(url, format="json")
+        with self.assertNumQueries(8):
+            self.client.get(response.data["next"], format="json")
+
+    def test_detail(self):
+        with self.assertNumQueries(10 + 1):
+            self.client.get(
+                reverse("business-detail", kwargs={"slug": "business1"}),
+                format="json",
+            )
+
+    def test_fragments(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"page_size": 10}
+        )
+        self.client.get(url, format="json")
+
+        business = Business.objects.get(name="business3")
+        updated_at = business.updated_at
+        with committed():
+            Phone.objects.create(number="438-555-5555", business=business)
+        business.refresh_from_db()
+        self.assertGreater(business.updated_at, updated_at)
+
+        # Only business3 is serialized again: validators, page, 6 relations
+        with self.assertNumQueries(8):
+            response = self.client.get(url, format="json")
+        phones = {
+            b["name"]: [p["number"] for p in b["phones"]]
+            for b in response.data["items"]
+        }
+        self.assertEqual(phones["business2"], ["514-555-5555"])
+        self.assertCountEqual(
+            phones["business3"], ["514-555-5555", "438-555-5555"]
+        )
+
+        # Shared rows do not touch the businesses rendering them
+        tag = Tag.objects.get()
+        with committed():
+            tag.name = "afro"
+            tag.save()
+        response = self.client.get(url, format="json")
+        for business in response.data["items"]:
+            self.assertEqual([t["name"] for t in business["tags"]], ["afro"])
+
+
+class TestSparseFieldsets(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Restaurant")
+        self.subcategory = Category.objects.create(
+            name="African", parent=category
+        )
+        self.business = Business.objects.create(
+            name="gracia afrika", category=category, status="accepted"
+        )
+        self.tag = Tag.objects.create(name="africain")
+        self.business.tags.add(self.tag)
+        Phone.objects.create(number="514-555-5555", business=self.business)
+        Address.objects.create(
+            street_number="123",
+            street_name="Wall Street",
+            city="Montréal",
+            business=self.business,
+        )
+
+    def test_list_fields(self):
+        url = reverse_querystring(
+            "business-list",
+            query_kwargs={"fields": "id,name,slug,category.name"},
+        )
+        # Validators, COUNT, page and the categories, no relation
+        with self.assertNumQueries(4):
+            response = self.client.get(url, format="json")
+        self.assertEqual(
+            response.json()["items"],
+            [
+                {
+                    "id": self.business.pk,
+                    "category": {"name": "Restaurant"},
+                    "name": "gracia afrika",
+                    "slug": "gracia-afrika",
+                }
+            ],
+        )
+
+    def test_list_expand(self):
+        url = reverse_querystring(
+            "business-list",
+            query_kwargs={"fields": "name", "expand": "addresses.city,tags"},
+        )
+        with self.assertNumQueries(5):
+            response = self.client.get(url, format="json")
+        self.assertEqual(
+            response.json()["items"],
+            [
+                {
+                    "name": "gracia afrika",
+                    "tags": [{"id": self.tag.pk, "name": "africain"}],
+                    "addresses": [{"city": "Montréal"}],
+                }
+            ],
+        )
+
+    def test_detail_fields(self):
+        url = reverse_querystring(
+            "business-detail",
+            kwargs={"pk": self.business.pk},
+            query_kwargs={"fields": "name,category,phones.number"},
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            response.json(),
+            {
+                "category": {
+                    "id": self.business.category_id,
+                    "name": "Restaurant",
+                    "slug": "restaurant",
+                    "children": [
+                        {
+                            "id": self.subcategory.pk,
+                            "name": "African",
+                            "slug": "african",
+                            "children": [],
+                        }
+                    ],
+                },
+                "name": "gracia afrika",
+                "phones": [{"number": "514-555-5555"}],
+            },
+        )
+
+    def test_unknown_fields(self):
+        for fields in ("name,rating", "name.first", "category.rating"):
+            url = reverse_querystring(
+                "business-list", query_kwargs={"fields": fields}
+            )
+            response = self.client.get(url, format="json")
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
+
+class TestCompactView(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Restaurant")
+        subcategory = Category.objects.create(name="African", parent=category)
+        self.business = Business.objects.create(
+            name="gracia afrika",
+            slogan="La cuisine de chez nous",
+            category=subcategory,
+            status="accepted",
+        )
+        self.business.tags.add(Tag.objects.create(name="africain"))
+        for city in ("Montréal", "Laval"):
+            Address.objects.create(
+                street_number="123",
+                street_name="Wall Street",
+                city=city,
+                business=self.business,
+            )
+        self.expected = {
+            "id": self.business.pk,
+            "name": "gracia afrika",
+            "slug": "gracia-afrika",
+            "slogan": "La cuisine de chez nous",
+            "status": "accepted",
+            "category": "Restaurant>African",
+            "tags": ["africain"],
+            "city": "Montréal",
+        }
+
+    def test_list(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"view": "compact"}
+        )
+        # Validators, COUNT, page, tags, addresses and the categories
+        with self.assertNumQueries(6):
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.json()["items"], [self.expected])
+
+        # Without the fast serializer, the categories come from the cache
+        serializer = CompactBusinessSerializer(
+            CompactBusinessSerializer.setup_eager_loading(
+                Business.objects.all()
+            ),
+            many=True,
+        )
+        with self.assertNumQueries(3):
+            self.assertEqual(serializer.data, [self.expected])
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"view": "compact", "fields": "id"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            response.json()["items"], [{"id": self.business.pk}]
+        )
+
+    def test_detail(self):
+        url = reverse_querystring(
+            "business-detail",
+            kwargs={"pk": self.business.pk},
+            query_kwargs={"view": "compact"},
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.json(), self.expected)
+
+    def test_unknown_view(self):
+        url = reverse_querystring(
+            "business-list", query_kwargs={"view": "detailed"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestFastSerializers(APITestCase):
+    fixtures = ["seed.json"]
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.create(
+            name="Coiffure", parent=Category.objects.get(pk=2)
+        )
+
+    def test_business_list(self):
+        serializer = FastBusinessListSerializer()
+        renderer = JSONRenderer()
+        businesses = Business.objects.order_by("id")
+        for language in ("en", "fr"):
+            with translation.override(language):
+                cache.clear()
+                fast = serializer.render_misses(
+                    list(serializer.values(businesses))
+                )
+                expected = [
+                    BusinessSerializer().render_fragment(b)
+                    for b in businesses.prefetch_related(
+                        *BusinessSerializer().get_prefetch_lookups()
+                    )
+                ]
+                self.assertEqual(
+                    renderer.render(fast), renderer.render(expected)
+                )
+
+    def test_compact_business_list(self):
+        serializer = FastCompactBusinessListSerializer()
+        businesses = Business.objects.order_by("id")
+        for language in ("en", "fr"):
+            with translation.override(language):
+                fast = serializer.render(list(serializer.values(businesses)))
+                expected = CompactBusinessSerializer(businesses, many=True)
+                self.assertEqual(
+                    JSONRenderer().render(fast),
+                    JSONRenderer().render(expected.data),
+                )
+
+    def test_tag_list(self):
+        tags = Tag.objects.order_by("id")
+        serializer = FastTagListSerializer()
+        self.assertEqual(
+            JSONRenderer().render(serializer.render(serializer.values(tags))),
+            JSONRenderer().render(TagSerializer(tags, many=True).data),
+        )
+
 
 def custom_serializer(obj):
     if isinstance(obj, BaseModel):
@@ -1,17 +1,25 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from rest_framework import status
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework.utils import json
 
 from users.models import CustomUser
-from ..models import Category
-from ..serializers import CategorySerializer
+from .utils import committed
+from ..models import Business, Category
+from ..serializers import CountedCategorySerializer
 
 
 class TestCategoryEndpoint(APITestCase):
     url = reverse("category-list")
 
     def setUp(self):
+        cache.clear()
         self.user = CustomUser.objects.create_user(
             email="jojo@mail.com", password="bizzare"
         )
@@ -20,17 +28,54 @@ class TestCategoryEndpoint(APITestCase):
         self.category = Category.objects.create(name="Restaurant")
         self.category2 = Category.objects.create(name="sous-restaurant")
 
+    def test_response_cached_until_write(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        with committed():
+            self.category2.parent = self.category
+            self.category2.save()
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 1)
+
+    def test_invalidated_on_commit(self):
+        self.client.get(self.url)
+        with committed():
+            self.category2.parent = self.category
+            self.category2.save()
+            # Until the write commits, readers keep the previous generation
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+            self.assertEqual(len(json.loads(response.content)), 2)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 1)
+
+    def test_conditional_get(self):
+        self.category2.parent = self.category
+        self.category2.save()
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Only rendered as a child of a listed category
+        with committed():
+            self.category2.name = "sous-restaurants"
+            self.category2.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_get_all(self):
         response = self.client.get(self.url)
         categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
+        serializer = CountedCategorySerializer(categories, many=True)
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_get_only_root(self):
         response = self.client.get(self.url + "?only_root=True")
         categories = Category.objects.filter(parent__isnull=True).all()
-        serializer = CategorySerializer(categories, many=True)
+        serializer = CountedCategorySerializer(categories, many=True)
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
@@ -39,7 +84,7 @@ class TestCategoryEndpoint(APITestCase):
             reverse("category-detail", kwargs={"pk": 1})
         )
         category = Category.objects.get(pk=1)
-        serializer = CategorySerializer(category, many=False)
+        serializer = CountedCategorySerializer(category, many=False)
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
@@ -49,7 +94,216 @@ class TestCategoryEndpoint(APITestCase):
             {"id": 1, "name": "jojo"},
         )
         category = Category.objects.get(pk=1)
-        serializer = CategorySerializer(category, many=False)
+        serializer = CountedCategorySerializer(category, many=False)
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual("jojo", category.name)
+
+
+class TestCategoryTree(APITestCase):
+    def setUp(self):
+        self.food = Category.objects.create(name="Food")
+        self.restaurant = Category.objects.create(
+            name="Restaurant", parent=self.food
+        )
+        self.african = Category.objects.create(
+            name="African", parent=self.restaurant
+        )
+        self.beauty = Category.objects.create(name="Beauty")
+
+    def test_path(self):
+        self.assertEqual(self.food.path, "1/")
+        self.assertEqual(self.african.path, "1/2/3/")
+        self.assertEqual(str(self.african), "Food>Restaurant>African")
+        self.assertEqual(sorted(self.food.get_children_ids()), [1, 2, 3])
+        self.assertEqual(self.african.get_children_ids(), [3])
+
+    def test_reparent_moves_subtree(self):
+        self.restaurant.parent = self.beauty
+        self.restaurant.save()
+        self.african.refresh_from_db()
+        self.assertEqual(self.african.path, "4/2/3/")
+        self.assertEqual(sorted(self.beauty.get_children_ids()), [2, 3, 4])
+        self.assertEqual(self.food.get_children_ids(), [1])
+
+    def test_delete_detaches_subtree(self):
+        self.food.delete()
+        self.african.refresh_from_db()
+        self.assertEqual(self.african.path, "2/3/")
+        self.assertEqual(str(self.african), "Restaurant>African")
+
+    def test_written_without_save(self):
+        Category.objects.bulk_create(
+            [Category(name="Hair", parent=self.beauty)]
+        )
+        hair = Category.objects.get(name="Hair")
+        with self.assertRaises(ValueError):
+            hair.get_descendants()
+
+        self.assertEqual(Category.rebuild_paths(), 1)
+        hair.refresh_from_db()
+        self.assertEqual(hair.path, f"4/{hair.pk}/")
+        self.assertEqual(self.beauty.get_children_ids(), [4, hair.pk])
+
+    def test_loaded_paths(self):
+        # The two seed categories, both roots, replace Food and Restaurant
+        # and African stays under the second one
+        call_command("loaddata", "seed.json", verbosity=0)
+        self.assertEqual(Category.objects.get(pk=2).path, "2/")
+        self.assertEqual(Category.objects.get(pk=3).path, "2/3/")
+        self.assertEqual(Category.rebuild_paths(), 0)
+
+    def test_clean(self):
+        self.beauty.parent = self.african
+        with self.assertRaises(ValidationError):
+            self.beauty.clean()
+
+        self.food.parent = self.african
+        with self.assertRaises(ValidationError):
+            self.food.clean()
+
+        self.restaurant.parent = self.beauty
+        self.restaurant.clean()
+
+
+class TestCategoryTreeEndpoint(APITestCase):
+    url = reverse("category-tree")
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.beauty = Category.objects.create(name="Beauty")
+        self.food = Category.objects.create(name="Food")
+        self.african = Category.objects.create(
+            name="African", parent=self.food
+        )
+        Category.objects.create(name="Senegalese", parent=self.african)
+
+    def test_get_tree(self):
+        response = self.client.get(self.url)
+        categories = Category.objects.filter(parent__isnull=True)
+        serializer = CountedCategorySerializer(categories, many=True)
+        self.assertEqual(json.loads(response.content), serializer.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cached(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+    def test_invalidated_on_save_and_delete(self):
+        self.client.get(self.url)
+        with committed():
+            self.african.name = "Afro"
+            self.african.save()
+        response = self.client.get(self.url)
+        self.assertEqual(
+            json.loads(response.content)[1]["children"][0]["name"], "Afro"
+        )
+
+        with committed():
+            self.beauty.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(len(json.loads(response.content)), 1)
+
+
+# Committed, so that the responses are invalidated (on commit)
+class TestCategoryBusinessCount(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.food = Category.objects.create(name="Food")
+        self.african = Category.objects.create(
+            name="African", parent=self.food
+        )
+        self.beauty = Category.objects.create(name="Beauty")
+        self.gracia = Business.objects.create(
+            name="gracia afrika", category=self.african, status="accepted"
+        )
+        self.restaurant = Business.objects.create(
+            name="restaurant2", category=self.food, status="pending"
+        )
+
+    def test_moved_on_commit(self):
+        paths = []
+
+        def bump_generation(name):
+            # Another process rebuilding the facet index now
+            paths.append(Category.objects.get(pk=self.african.pk).path)
+
+        with mock.patch("backend.facets.bump_generation", bump_generation):
+            self.african.parent = self.beauty
+            self.african.save()
+        self.assertEqual(paths, [f"{self.beauty.pk}/{self.african.pk}/"])
+
+    def assertCounts(self, **counts):
+        self.assertEqual(
+            dict(Category.objects.values_list("name", "business_count")),
+            counts,
+        )
+
+    def test_counts(self):
+        self.assertCounts(Food=1, African=1, Beauty=0)
+
+        self.restaurant.status = "accepted"
+        self.restaurant.save()
+        self.gracia.category = self.beauty
+        self.gracia.save()
+        self.assertCounts(Food=1, African=0, Beauty=1)
+
+        self.gracia.delete()
+        self.assertCounts(Food=1, African=0, Beauty=0)
+
+        self.food.parent = self.beauty
+        self.food.save()
+        self.assertCounts(Food=1, African=0, Beauty=1)
+
+        self.food.delete()
+        self.assertCounts(African=0, Beauty=0)
+
+    def test_saved_with_business(self):
+        self.restaurant.status = "accepted"
+        with mock.patch(
+            "backend.signals.move_business_count", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.restaurant.save()
+        # The business was not saved without its counters
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.status, "pending")
+        self.assertCounts(Food=1, African=1, Beauty=0)
+
+    def test_endpoints(self):
+        response = self.client.get(reverse("category-tree"))
+        self.assertEqual(
+            [c["business_count"] for c in json.loads(response.content)],
+            [0, 1],
+        )
+        self.restaurant.status = "accepted"
+        self.restaurant.save()
+        response = self.client.get(
+            reverse("category-detail", kwargs={"pk": self.food.pk})
+        )
+        self.assertEqual(response.data["business_count"], 2)
+        response = self.client.get(reverse("category-tree"))
+        self.assertEqual(json.loads(response.content)[1]["business_count"], 2)
+
+    def test_rebuild(self):
+        Business.objects.update(status="accepted")
+        self.assertCounts(Food=1, African=1, Beauty=0)
+        out = StringIO()
+        call_command("rebuild_category_counts", stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "0 category paths fixed\n1 category counters fixed\n",
+        )
+        self.assertCounts(Food=2, African=1, Beauty=0)
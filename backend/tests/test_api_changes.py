@@ -0,0 +1,133 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from main.utils import reverse_querystring
+from users.models import CustomUser
+from ..models import Business, Category, Phone, Tag
+
+
+@override_settings(SYNC_SAFETY_WINDOW=0)
+class TestBusinessChangesEndpoint(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.business = Business.objects.create(
+            name="gracia afrika", status="accepted"
+        )
+        self.business2 = Business.objects.create(
+            name="restaurant2", status="accepted"
+        )
+        self.pending = Business.objects.create(
+            name="business3", status="pending"
+        )
+
+    def get(self, **query_kwargs):
+        return self.client.get(
+            reverse_querystring("business-changes", query_kwargs=query_kwargs)
+        )
+
+    def test_full_sync(self):
+        response = self.client.get(reverse("business-changes"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [b["name"] for b in response.data["upserted"]],
+            ["gracia afrika", "restaurant2"],
+        )
+        # Never accepted, the client just has nothing to drop
+        self.assertEqual(response.data["deleted"], [self.pending.pk])
+        self.assertFalse(response.data["has_more"])
+
+    def test_changes_since_token(self):
+        token = self.get().data["sync_token"]
+        response = self.get(since=token)
+        self.assertEqual(response.data["upserted"], [])
+        self.assertEqual(response.data["deleted"], [])
+        self.assertEqual(response.data["sync_token"], token)
+
+        Phone.objects.create(number="514-555-5555", business=self.business2)
+        self.business.delete()
+        response = self.get(since=token)
+        self.assertEqual(
+            [b["name"] for b in response.data["upserted"]], ["restaurant2"]
+        )
+        self.assertEqual(
+            response.data["upserted"][0]["phones"][0]["number"],
+            "514-555-5555",
+        )
+        self.assertEqual(response.data["deleted"], [self.business.pk])
+        self.assertIsNotNone(
+            Business.objects.get(pk=self.business.pk).deleted_at
+        )
+
+    def test_pages(self):
+        response = self.get(page_size=2)
+        self.assertTrue(response.data["has_more"])
+        response = self.get(page_size=2, since=response.data["sync_token"])
+        self.assertEqual(response.data["deleted"], [self.pending.pk])
+        self.assertFalse(response.data["has_more"])
+
+    def test_since_timestamp(self):
+        response = self.get(since="2100-01-01T00:00:00")
+        self.assertEqual(response.data["upserted"], [])
+        self.assertEqual(response.data["sync_token"], "2100-01-01T00:00:00")
+
+        response = self.get(since="not a token")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lookup_changes(self):
+        tag = Tag.objects.create(name="africain")
+        self.business.tags.add(tag)
+        category = Category.objects.create(name="Food")
+        self.business2.category = category
+        self.business2.save()
+        token = self.get().data["sync_token"]
+
+        tag.name = "afro"
+        tag.save()
+        response = self.get(since=token)
+        self.assertEqual(
+            [b["name"] for b in response.data["upserted"]], ["gracia afrika"]
+        )
+        token = response.data["sync_token"]
+
+        category.delete()
+        response = self.get(since=token)
+        self.assertEqual(
+            [b["name"] for b in response.data["upserted"]], ["restaurant2"]
+        )
+        self.assertIsNone(response.data["upserted"][0]["category"])
+
+    @override_settings(SYNC_SAFETY_WINDOW=60)
+    def test_safety_window(self):
+        response = self.get()
+        self.assertEqual(len(response.data["upserted"]), 2)
+        token = response.data["sync_token"]
+
+        # Stamped before the first sync, committed after it
+        late = Business.objects.create(name="late", status="accepted")
+        Business.objects.filter(pk=late.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=30)
+        )
+        response = self.get(since=token)
+        self.assertEqual(
+            [b["name"] for b in response.data["upserted"]],
+            ["late", "gracia afrika", "restaurant2"],
+        )
+
+        later = timezone.now() + timedelta(seconds=120)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            token = self.get(since=response.data["sync_token"]).data[
+                "sync_token"
+            ]
+            response = self.get(since=token)
+        self.assertEqual(response.data["upserted"], [])
+        self.assertEqual(response.data["deleted"], [])
@@ -0,0 +1,80 @@
+import csv
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from main.utils import reverse_querystring
+from users.models import CustomUser
+from ..export import export_queryset, export_records
+from ..models import Business, Category, Phone, Tag
+from ..serializers import BusinessSerializer
+
+
+class TestBusinessExportEndpoint(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Restaurant")
+        tag = Tag.objects.create(name="coiffure")
+        for name in ("gracia afrika", "restaurant2", "business3"):
+            business = Business.objects.create(
+                name=name, category=category, status="accepted"
+            )
+            business.tags.add(tag)
+            Phone.objects.create(number="514-555-5555", business=business)
+        Business.objects.create(name="business4", status="pending")
+        Business.objects.get(name="business3").delete()
+
+    def expected(self):
+        businesses = export_queryset().prefetch_related(
+            *BusinessSerializer().get_prefetch_lookups()
+        )
+        return json.loads(
+            json.dumps(BusinessSerializer(businesses, many=True).data)
+        )
+
+    def test_ndjson(self):
+        response = self.client.get(reverse("business-export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        content = b"".join(response.streaming_content).decode()
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(records, self.expected())
+
+    def test_csv(self):
+        response = self.client.get(
+            reverse_querystring(
+                "business-export", query_kwargs={"format": "csv"}
+            )
+        )
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(
+            [row["name"] for row in rows], ["gracia afrika", "restaurant2"]
+        )
+        self.assertEqual(
+            json.loads(rows[0]["tags"]), self.expected()[0]["tags"]
+        )
+
+    def test_prefetch_per_chunk(self):
+        # Rows, then per chunk the category children and 6 relations
+        with self.assertNumQueries(1 + 2 * 7):
+            records = list(export_records(export_queryset(), chunk_size=1))
+        self.assertEqual(len(records), 2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("export_businesses", "--chunk-size=1", stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records, self.expected())
@@ -0,0 +1,27 @@
+from django.test import override_settings, SimpleTestCase
+
+from ..cache import check_shared_cache
+
+LOCMEM = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+DATABASE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "backend_cache",
+    }
+}
+
+
+class TestSharedCacheCheck(SimpleTestCase):
+    def test_process_local(self):
+        with override_settings(DEBUG=False, CACHES=LOCMEM):
+            errors = check_shared_cache(None)
+        self.assertEqual([e.id for e in errors], ["backend.E001"])
+
+        with override_settings(DEBUG=True, CACHES=LOCMEM):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_shared(self):
+        with override_settings(DEBUG=False, CACHES=DATABASE):
+            self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,126 @@
+import gzip
+import json
+from unittest import mock, skipIf, TestCase
+
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from users.models import CustomUser
+from ..compression import accepted_encoding, compress
+from ..models import Business, Category, Phone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class TestAcceptedEncoding(TestCase):
+    def accepted(self, header):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=header)
+        return accepted_encoding(request)
+
+    def test_gzip(self):
+        self.assertEqual(self.accepted("gzip, deflate"), "gzip")
+        self.assertEqual(self.accepted("deflate"), None)
+        self.assertEqual(self.accepted(""), None)
+        self.assertEqual(self.accepted("gzip;q=0"), None)
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_preference(self):
+        self.assertEqual(self.accepted("gzip, deflate, br"), "br")
+        self.assertEqual(self.accepted("br;q=0.5, gzip;q=0.8"), "gzip")
+        self.assertEqual(self.accepted("*;q=0.1, gzip;q=0"), "br")
+        self.assertEqual(self.accepted("BR;Q=1 , gzip"), "br")
+
+
+class TestCompressedResponses(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Restaurant")
+        Category.objects.create(name="African", parent=category)
+        for name in ("gracia afrika", "restaurant2"):
+            business = Business.objects.create(
+                name=name, category=category, status="accepted"
+            )
+            Phone.objects.create(number="514-555-5555", business=business)
+
+    def test_cached_list(self):
+        url = reverse("business-list")
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        cache.clear()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            response["Content-Length"], str(len(response.content))
+        )
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # Compressed once, when the response was cached
+        with mock.patch("backend.views.compress") as compress_mock:
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        compress_mock.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        response = self.client.get(
+            url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_cached_list_brotli(self):
+        url = reverse("business-list")
+        plain = self.client.get(url)
+        # Cached uncompressed: compressed on the first brotli request only
+        with mock.patch(
+            "backend.views.compress", side_effect=compress
+        ) as compress_mock:
+            for _ in range(2):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING="br")
+                self.assertEqual(response["Content-Encoding"], "br")
+                self.assertEqual(
+                    brotli.decompress(response.content), plain.content
+                )
+        compress_mock.assert_called_once()
+
+    def test_category_tree(self):
+        for name in ("Beauty", "Clothing", "Groceries", "Services"):
+            Category.objects.create(name=name)
+        url = reverse("category-tree")
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_streaming_export(self):
+        response = self.client.get(
+            reverse("business-export"), HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content))
+        names = [json.loads(line)["name"] for line in content.splitlines()]
+        self.assertEqual(sorted(names), ["gracia afrika", "restaurant2"])
+
+    def test_small_response(self):
+        Business.objects.all().delete()
+        response = self.client.get(
+            reverse("business-list"), HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertLess(len(response.content), 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
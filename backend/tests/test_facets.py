@@ -0,0 +1,236 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from main.utils import reverse_querystring
+from users.models import CustomUser
+from .utils import committed
+from ..facets import facet_index, from_bitset, to_bitset, FacetIndex
+from ..models import Address, Business, Category, PaymentType, Tag
+
+
+class TestFacetIndex(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Generations restart with the cache: forget other tests' index
+        facet_index._generation = None
+        self.user = CustomUser.objects.create_user(
+            email="jojo@mail.com", password="bizzare"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.food = Category.objects.create(name="Food")
+        self.african = Category.objects.create(
+            name="African", parent=self.food
+        )
+        self.beauty = Category.objects.create(name="Beauty")
+        self.coiffure = Tag.objects.create(name="coiffure")
+        self.africain = Tag.objects.create(name="africain")
+        self.cash = PaymentType.objects.create(name="cash")
+        self.gracia = Business.objects.create(
+            name="gracia afrika", category=self.african, status="accepted"
+        )
+        self.restaurant = Business.objects.create(
+            name="restaurant2", category=self.food, status="accepted"
+        )
+        self.salon = Business.objects.create(
+            name="salon", category=self.beauty, status="accepted"
+        )
+        self.gracia.tags.add(self.coiffure, self.africain)
+        self.restaurant.tags.add(self.africain)
+        self.salon.tags.add(self.coiffure)
+        self.cash.business_set.add(self.gracia, self.salon)
+
+    def filter(self, **selected):
+        return from_bitset(facet_index.filter(**selected))
+
+    def assertSameAsDatabase(self):
+        rebuilt = FacetIndex()
+        for facet, model in [
+            ("tags", Tag),
+            ("payment_types", PaymentType),
+            ("categories", Category),
+        ]:
+            for pk in model.objects.values_list("pk", flat=True):
+                self.assertEqual(
+                    facet_index.bitset(facet, pk),
+                    rebuilt.bitset(facet, pk),
+                    (facet, pk),
+                )
+
+    def test_bitsets(self):
+        ids = [0, 3, 8, 9, 700]
+        self.assertEqual(from_bitset(to_bitset(ids)), ids)
+        self.assertEqual(to_bitset([]), 0)
+
+    def test_filter(self):
+        self.assertEqual(
+            self.filter(tags=[self.coiffure.pk]),
+            [self.gracia.pk, self.salon.pk],
+        )
+        self.assertEqual(
+            self.filter(tags=[self.coiffure.pk, self.africain.pk]),
+            [self.gracia.pk],
+        )
+        self.assertEqual(
+            self.filter(categories=[self.food.pk]),
+            [self.gracia.pk, self.restaurant.pk],
+        )
+        self.assertEqual(
+            self.filter(
+                categories=[self.african.pk, self.beauty.pk],
+                payment_types=[self.cash.pk],
+            ),
+            [self.gracia.pk, self.salon.pk],
+        )
+        businesses = to_bitset([self.gracia.pk, self.restaurant.pk])
+        self.assertEqual(
+            facet_index.counts("categories", businesses),
+            {self.food.pk: 2, self.african.pk: 1},
+        )
+        self.assertEqual(
+            facet_index.counts("tags", businesses),
+            {self.coiffure.pk: 1, self.africain.pk: 2},
+        )
+
+    def test_patched(self):
+        self.assertSameAsDatabase()
+        with committed():
+            self.restaurant.tags.add(self.coiffure)
+            self.salon.tags.remove(self.coiffure)
+            self.africain.business_set.remove(self.gracia)
+            self.cash.business_set.clear()
+            self.gracia.payment_types.add(self.cash)
+            self.restaurant.category = self.beauty
+            self.restaurant.save()
+        # Patched in place, not rebuilt
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.filter(tags=[self.coiffure.pk]),
+                [self.gracia.pk, self.restaurant.pk],
+            )
+        self.assertSameAsDatabase()
+
+        with committed():
+            self.gracia.tags.clear()
+            self.coiffure.delete()
+            self.food.parent = self.beauty
+            self.food.save()
+        self.assertEqual(
+            self.filter(categories=[self.beauty.pk]),
+            [self.gracia.pk, self.restaurant.pk, self.salon.pk],
+        )
+        self.assertSameAsDatabase()
+
+    def test_rolled_back(self):
+        self.assertSameAsDatabase()
+        with committed():
+            try:
+                with transaction.atomic():
+                    self.restaurant.tags.add(self.coiffure)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(
+            self.filter(tags=[self.coiffure.pk]),
+            [self.gracia.pk, self.salon.pk],
+        )
+
+    def test_endpoint(self):
+        url = reverse_querystring(
+            "business-list",
+            query_kwargs={
+                "tags": f"{self.coiffure.pk},{self.africain.pk}",
+                "categories": self.food.pk,
+            },
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(
+            [b["name"] for b in response.json()["items"]], ["gracia afrika"]
+        )
+
+        # Above MAX_FILTER_IDS, with joins
+        for query_kwargs in [
+            {"tags": f"{self.coiffure.pk},{self.africain.pk}"},
+            {"categories": f"{self.african.pk},{self.beauty.pk}"},
+            {"categories": self.food.pk, "payment_types": self.cash.pk},
+        ]:
+            url = reverse_querystring(
+                "business-list", query_kwargs=query_kwargs
+            )
+            expected = [
+                b["name"] for b in self.client.get(url).json()["items"]
+            ]
+            cache.clear()
+            with override_settings(MAX_FILTER_IDS=0):
+                response = self.client.get(url, format="json")
+            self.assertEqual(
+                [b["name"] for b in response.json()["items"]],
+                expected,
+                query_kwargs,
+            )
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"tags": "coiffure"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_counts(self):
+        for business, city in [
+            (self.gracia, "Montréal"),
+            (self.salon, "montreal"),
+            (self.restaurant, "Laval"),
+        ]:
+            Address.objects.create(
+                street_number="1",
+                street_name="Principale",
+                city=city,
+                postal_code="H2X 1A1",
+                business=business,
+            )
+        url = reverse_querystring(
+            "business-list",
+            query_kwargs={
+                "tags": self.coiffure.pk,
+                "facets": "category,tags,payment_types,city",
+            },
+        )
+        response = self.client.get(url, format="json")
+        facets = response.json()["facets"]
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["category"]],
+            [("African", 1), ("Beauty", 1), ("Food", 1)],
+        )
+        self.assertEqual(
+            facets["tags"],
+            [
+                {"id": self.coiffure.pk, "name": "coiffure", "count": 2},
+                {"id": self.africain.pk, "name": "africain", "count": 1},
+            ],
+        )
+        self.assertEqual(
+            facets["payment_types"],
+            [{"id": self.cash.pk, "name": "cash", "count": 2}],
+        )
+        self.assertEqual(facets["city"], [{"name": "Montréal", "count": 2}])
+
+        # Counted on the searched businesses as a subquery
+        url = reverse_querystring(
+            "business-list",
+            query_kwargs={"querySearch": "salon", "facets": "city"},
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()["facets"]["city"],
+            [{"name": "montreal", "count": 1}],
+        )
+
+        url = reverse_querystring(
+            "business-list", query_kwargs={"facets": "tags,owner"}
+        )
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,97 @@
+import random
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..geo import (
+    addresses_near,
+    businesses_near,
+    fsa_centroids,
+    geohash_encode,
+    geohash_range,
+    haversine,
+    nearest_businesses,
+    NEAREST_START_PRECISION,
+)
+from ..models import Address, Business
+
+
+class TestGeohash(TestCase):
+    def test_encode(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(geohash_encode(45.5664, -73.647, 4), "f25e")
+
+    def test_range(self):
+        self.assertEqual(geohash_range("f25d"), ("f25d", "f25e"))
+        self.assertEqual(geohash_range("f259"), ("f259", "f25b"))
+        self.assertEqual(geohash_range("f2zz"), ("f2zz", "f3"))
+        self.assertEqual(geohash_range("zz"), ("zz", None))
+
+
+class TestNearestBusinesses(TestCase):
+    def setUp(self):
+        self.random = random.Random(42)
+        fsas = self.random.sample(sorted(fsa_centroids()), 150)
+        for i, fsa in enumerate(fsas):
+            business = Business.objects.create(
+                name=f"business{i}", status="accepted"
+            )
+            Address.objects.create(
+                street_number="1",
+                street_name="Principale",
+                postal_code=f"{fsa} 1A1",
+                business=business,
+            )
+
+    def brute_force(self, latitude, longitude, limit, radius=None, **filters):
+        distances = {}
+        for pk, lat, lng in Address.objects.filter(**filters).values_list(
+            "business_id", "latitude", "longitude"
+        ):
+            distance = haversine(latitude, longitude, lat, lng)
+            if radius is None or distance <= radius:
+                distances[pk] = min(distance, distances.get(pk, distance))
+        return sorted(distances.items(), key=lambda d: (d[1], d[0]))[:limit]
+
+    def test_same_as_brute_force(self):
+        businesses = Business.objects.all()
+        for _ in range(30):
+            lat, lng = self.random.choice(list(fsa_centroids().values()))
+            # Around populated places as well as in the middle of nowhere
+            lat += self.random.uniform(-1, 1)
+            lng += self.random.uniform(-1, 1)
+            for limit, radius in [(1, None), (5, None), (10, 50)]:
+                with CaptureQueriesContext(connection) as queries:
+                    nearest = nearest_businesses(
+                        businesses, lat, lng, limit, radius
+                    )
+                self.assertLessEqual(len(queries), NEAREST_START_PRECISION + 1)
+                self.assertEqual(
+                    nearest, self.brute_force(lat, lng, limit, radius)
+                )
+
+    def test_filtered(self):
+        businesses = Business.objects.filter(name__endswith="7")
+        self.assertEqual(
+            nearest_businesses(businesses, 45.5, -73.6, 5),
+            self.brute_force(45.5, -73.6, 5, business__name__endswith="7"),
+        )
+
+    def test_addresses_near(self):
+        for _ in range(30):
+            lat, lng = self.random.choice(list(fsa_centroids().values()))
+            for radius in (5, 50, 250):
+                exact = businesses_near(lat, lng, radius)
+                approximated = set(
+                    addresses_near(lat, lng, radius).values_list(
+                        "business_id", flat=True
+                    )
+                )
+                for pk in exact ^ approximated:
+                    # Only differs right on the circle
+                    address = Address.objects.get(business_id=pk)
+                    distance = haversine(
+                        lat, lng, address.latitude, address.longitude
+                    )
+                    self.assertAlmostEqual(distance / radius, 1, delta=0.01)
@@ -0,0 +1,70 @@
+import datetime
+from unittest import TestCase
+
+from django.utils import timezone
+
+from ..hours import open_hours, opening_slots, parse_moment, slot_lookup
+
+
+def is_open(slots, moment):
+    hour, quarters = slot_lookup(moment)
+    # What OpenAtFilter looks for in the business' BusinessOpenHour rows
+    return any(h == hour and q in quarters for h, q in open_hours(slots))
+
+
+class TestOpeningSlots(TestCase):
+    def local(self, *args):
+        return timezone.make_aware(datetime.datetime(*args))
+
+    def test_slots(self):
+        slots = opening_slots(
+            [
+                # Monday
+                (1, datetime.time(9, 10), datetime.time(17), False),
+                (2, None, None, True),
+                # Saturday night to Sunday
+                (6, datetime.time(22), datetime.time(2), False),
+                # Sunday night to Monday
+                (7, datetime.time(23, 30), datetime.time(0, 45), False),
+            ]
+        )
+        self.assertEqual(len(slots), 168)
+        # 2021-01-04 is a Monday
+        self.assertEqual(slots[:24], "7" + "0" * 8 + "e" + "f" * 7 + "0" * 7)
+        for moment, expected in [
+            ((2021, 1, 4, 9, 14), False),
+            ((2021, 1, 4, 9, 15), True),
+            ((2021, 1, 4, 16, 59), True),
+            ((2021, 1, 4, 17), False),
+            ((2021, 1, 5, 12), False),
+            ((2021, 1, 9, 23), True),
+            ((2021, 1, 10, 1, 59), True),
+            ((2021, 1, 10, 2), False),
+            ((2021, 1, 10, 23, 45), True),
+            ((2021, 1, 11, 0, 30), True),
+            ((2021, 1, 11, 0, 45), False),
+        ]:
+            self.assertEqual(
+                is_open(slots, self.local(*moment)), expected, moment
+            )
+
+    def test_time_zone(self):
+        slots = opening_slots(
+            [(1, datetime.time(10), datetime.time(11), False)]
+        )
+        # 10:30 in Montréal is 15:30 UTC in winter and 14:30 in summer
+        for moment, expected in [
+            ("2021-01-04T15:30:00+00:00", True),
+            ("2021-01-04T14:30:00+00:00", False),
+            ("2021-07-05T14:30:00Z", True),
+            ("2021-07-05T15:30:00Z", False),
+            ("2021-07-05T10:30:00", True),
+        ]:
+            self.assertEqual(
+                is_open(slots, parse_moment(moment)), expected, moment
+            )
+
+    def test_parse_moment(self):
+        for value in ("tomorrow", "2021-13-01T10:00", "2021-03-14T02:30"):
+            with self.assertRaises(ValueError):
+                parse_moment(value)
@@ -0,0 +1,55 @@
+import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from ..renderers import EncodedDict, FastJSONRenderer
+
+
+class TestFastJSONRenderer(TestCase):
+    def test_same_as_drf(self):
+        data = {
+            "items": [
+                {
+                    "name": "Café Créole",
+                    "slogan": "line\u2028separator",
+                    "created_at": datetime.datetime(
+                        2021, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc
+                    ),
+                    "accepted_at": datetime.date(2021, 1, 2),
+                    "opening_time": datetime.time(9, 30),
+                    "price": Decimal("1.50"),
+                    "label": gettext_lazy("Monday"),
+                    "extension": None,
+                    "closed": False,
+                    1: 2**70,
+                }
+            ],
+            "next": None,
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_splice_encoded(self):
+        fragment = EncodedDict.encode({"id": 1, "name": "gracia afrika"})
+        fragment.encoded = b'{"pre":"encoded"}'
+        content = FastJSONRenderer().render(
+            {"items": [fragment, {"id": 2}], "next": None}
+        )
+        self.assertEqual(
+            content, b'{"items":[{"pre":"encoded"},{"id":2}],"next":null}'
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(fragment), b'{"pre":"encoded"}'
+        )
+
+    def test_indent(self):
+        data = {"items": [EncodedDict.encode({"id": 1})]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
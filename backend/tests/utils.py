@@ -0,0 +1,17 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def committed():
+    """
+    Run the on_commit callbacks registered in the block as if it had
+    committed, which the transaction of a TestCase never does.
+    """
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
@@ -6,9 +6,12 @@ from .views import (
     BusinessView,
     BusinessListView,
     BusinessAutoCompleteView,
+    BusinessChangesView,
+    BusinessExportView,
     TagViewSet,
     CategoryView,
     CategoryListView,
+    CategoryTreeView,
     BusinessSuggestionListView,
     BusinessSuggestionView,
 )
@@ -26,6 +29,16 @@ urlpatterns = [
         BusinessAutoCompleteView.as_view(),
         name="business-autocomplete",
     ),
+    path(
+        "businesses/changes",
+        BusinessChangesView.as_view(),
+        name="business-changes",
+    ),
+    path(
+        "businesses/export",
+        BusinessExportView.as_view(),
+        name="business-export",
+    ),
     path(
         "api-auth/", include("rest_framework.urls", namespace="rest_framework")
     ),
@@ -49,6 +62,7 @@ urlpatterns = [
         name="business-detail",
     ),
     path("categories/", CategoryListView.as_view(), name="category-list"),
+    path("categories/tree/", CategoryTreeView.as_view(), name="category-tree"),
     path(
         "categories/<int:pk>/", CategoryView.as_view(), name="category-detail"
     ),
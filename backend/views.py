@@ -1,21 +1,68 @@
+import hashlib
 import logging
 from datetime import datetime
 
-import textdistance
-from django.db.models import Q
-from rest_framework import viewsets, status, filters, generics
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from rest_framework import viewsets, status, generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView, get_object_or_404
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from url_filter.integrations.drf import DjangoFilterBackend
 
+from backend.cache import (
+    get_generation,
+    versioned_key,
+    request_digest,
+    response_cache_key,
+    BUSINESS_FRAGMENTS,
+    BUSINESS_RESPONSES,
+    CATEGORY_RESPONSES,
+    CATEGORY_TREE,
+    RESPONSE_CACHE_TIMEOUT,
+    TAG_RESPONSES,
+)
+from backend.compression import (
+    accepted_encoding,
+    compress,
+    set_encoded_content,
+    MIN_COMPRESSED_SIZE,
+)
+from backend.export import export_queryset, export_records
+from backend.facets import facet_counts, COUNTED_FACETS
+from backend.fast_serializers import (
+    FastBusinessListSerializer,
+    FastCompactBusinessListSerializer,
+    FastTagListSerializer,
+)
+from backend.filters import (
+    FacetFilter,
+    FullTextSearchFilter,
+    NearFilter,
+    OpenAtFilter,
+)
+from backend.hours import local_week_slot
 from backend.models import Category, Business, Tag, BusinessSuggestion
 from backend.pagination import DefaultPagination
+from backend.renderers import CSVRenderer, NDJSONRenderer
+from backend.search import fold, fuzzy_index
+from backend.sync import changes
 from backend.serializers import (
     UserSerializer,
-    CategorySerializer,
+    CountedCategorySerializer,
     BusinessSerializer,
+    CompactBusinessSerializer,
     TagSerializer,
     SuggestionSerializer,
+    parse_field_selection,
+    serialize_category_tree,
 )
 from users.models import CustomUser
 
@@ -40,22 +87,365 @@ class MultipleFieldLookupMixin:
         return obj
 
 
+def get_cached_response(request, key, timeout):
+    """
+    Response of the (content, content type) cached under `key`, or None.
+    The content is compressed with the coding the client accepts and the
+    compressed bytes are cached next to it, under `key:<coding>`.
+    """
+    encoding = accepted_encoding(request)
+    encoded_key = f"{key}:{encoding}"
+    cached = cache.get_many([key, encoded_key])
+    if key not in cached:
+        return None
+
+    content, content_type = cached[key]
+    response = HttpResponse(content, content_type=content_type)
+    if encoding is not None and len(content) >= MIN_COMPRESSED_SIZE:
+        encoded = cached.get(encoded_key)
+        if encoded is None:
+            encoded = compress(content, encoding)
+            cache.set(encoded_key, encoded, timeout)
+        set_encoded_content(response, encoded, encoding)
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Cache the rendered JSON of `list` and `retrieve` until one of the
+    `cache_generations` is bumped by a write, see `backend.signals`.
+    The body is also cached compressed with each content coding clients
+    asked for, so a hot response is only compressed once per coding.
+    """
+
+    cache_generations = ()
+
+    def get_cache_variants(self):
+        """What responses depend on besides the request, e.g. the time."""
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(
+            request, self.cache_generations, self.get_cache_variants()
+        )
+        response = get_cached_response(request, key, RESPONSE_CACHE_TIMEOUT)
+        if response is not None:
+            return response
+
+        encoding = accepted_encoding(request)
+
+        def cache_response(response):
+            entries = {key: (response.content, response["Content-Type"])}
+            if (
+                encoding is not None
+                and len(response.content) >= MIN_COMPRESSED_SIZE
+            ):
+                encoded = compress(response.content, encoding)
+                entries[f"{key}:{encoding}"] = encoded
+                set_encoded_content(response, encoded, encoding)
+            cache.set_many(entries, RESPONSE_CACHE_TIMEOUT)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response.add_post_render_callback(cache_response)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs of `list` and `retrieve` with 304 Not Modified
+    before anything is serialized. Validators are the object's
+    `updated_at` for details, max(updated_at) and the row count of the
+    filtered queryset for lists, plus the `validator_generations` of the
+    shared rows rendered without touching `updated_at`.
+
+    Rows leaving a list do not move its max(updated_at), only its count,
+    so lists only have an ETag: a Last-Modified would answer 304 to
+    clients sending only If-Modified-Since after such changes.
+
+    Validators are cached like the responses, until one of the
+    `cache_generations` is bumped, so a revalidation costs no query.
+    """
+
+    validator_generations = ()
+
+    def get_cache_variants(self):
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            self.get_list_validators,
+            super().list,
+            request,
+            *args,
+            with_last_modified=False,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            self.get_object_validators,
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def get_validator_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def get_list_validators(self):
+        validators = self.get_validator_queryset().aggregate(
+            last_modified=Max("updated_at"), count=Count("pk")
+        )
+        return validators["last_modified"], validators["count"]
+
+    def get_object_validators(self):
+        last_modified = (
+            self.get_queryset()
+            .filter(**self.get_lookup_filter())
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        if last_modified is None:
+            return None
+        return last_modified, 1
+
+    def get_lookup_filter(self):
+        lookup_fields = getattr(self, "lookup_fields", None)
+        if lookup_fields is None:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            return {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        return {f: self.kwargs[f] for f in lookup_fields if f in self.kwargs}
+
+    def get_validators(self, request, compute):
+        """(ETag, Last-Modified timestamp) or None when nothing matches."""
+        generations = getattr(self, "cache_generations", ())
+        variants = self.get_cache_variants()
+        key = response_cache_key(request, generations, variants)
+        key = f"{key}:validators"
+        validators = cache.get(key) if generations else None
+        if validators is not None:
+            return validators
+
+        computed = compute()
+        if computed is None:
+            return None
+        last_modified, count = computed
+        versions = [get_generation(n) for n in self.validator_generations]
+        etag = hashlib.sha1(
+            f"{request_digest(request, variants)}:{last_modified}:{count}:"
+            f"{versions}".encode()
+        ).hexdigest()
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+
+        validators = (quote_etag(etag), last_modified)
+        if generations:
+            cache.set(key, validators, RESPONSE_CACHE_TIMEOUT)
+        return validators
+
+    def get_conditional_response(
+        self,
+        compute,
+        handler,
+        request,
+        *args,
+        with_last_modified=True,
+        **kwargs,
+    ):
+        validators = self.get_validators(request, compute)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validators
+        if not with_last_modified:
+            last_modified = None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class FastListMixin:
+    """
+    Serve `list` with `fast_serializer_class`, which renders the values()
+    rows of the page instead of model instances, see
+    `backend.fast_serializers`.
+    """
+
+    fast_serializer_class = None
+
+    def get_fast_serializer_class(self):
+        return self.fast_serializer_class
+
+    def get_fast_serializer(self):
+        return self.get_fast_serializer_class()()
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_fast_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serializer.render(queryset))
+        return self.get_paginated_response(serializer.render(page))
+
+
+class FieldSelectionMixin:
+    """
+    Sparse representations of GET requests: `?fields=id,name,category.name`
+    keeps the listed fields, `?expand=addresses` adds relations to them.
+    See `parse_field_selection`.
+    """
+
+    def get_field_selection(self):
+        if self.request.method != "GET":
+            return None
+        return parse_field_selection(
+            self.request.query_params.get("fields"),
+            self.request.query_params.get("expand"),
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_fast_serializer(self):
+        return self.get_fast_serializer_class()(
+            fields=self.get_field_selection()
+        )
+
+
+class RepresentationMixin:
+    """
+    Let GET requests pick the representation with `?view=compact` or
+    `?view=full`; `representation` is the one served by default.
+    Writes always go through the default serializer.
+    """
+
+    representation = "full"
+    serializer_classes = {
+        "full": BusinessSerializer,
+        "compact": CompactBusinessSerializer,
+    }
+    fast_serializer_classes = {
+        "full": FastBusinessListSerializer,
+        "compact": FastCompactBusinessListSerializer,
+    }
+
+    def get_representation(self):
+        if self.request.method != "GET":
+            return self.representation
+        representation = self.request.query_params.get(
+            "view", self.representation
+        )
+        if representation not in self.serializer_classes:
+            raise ValidationError(
+                {
+                    "view": [
+                        f"Unknown view: {representation}. Expected one of "
+                        f"{', '.join(self.serializer_classes)}."
+                    ]
+                }
+            )
+        return representation
+
+    def get_serializer_class(self):
+        return self.serializer_classes[self.get_representation()]
+
+    def get_fast_serializer_class(self):
+        return self.fast_serializer_classes[self.get_representation()]
+
+
+class FacetCountsMixin:
+    """
+    `?facets=category,tags` adds the number of the filtered businesses
+    per value of the listed facets to the list, next to `items`, see
+    `facet_counts`. They are cached with the page by CachedResponseMixin.
+    """
+
+    requested_facets = ()
+
+    def get_requested_facets(self):
+        facets = self.request.query_params.get("facets")
+        if not facets:
+            return []
+        facets = facets.split(",")
+        unknown = [f for f in facets if f not in COUNTED_FACETS]
+        if unknown:
+            raise ValidationError(
+                {
+                    "facets": [
+                        f"Unknown facets: {', '.join(unknown)}. Expected "
+                        f"some of {', '.join(COUNTED_FACETS)}."
+                    ]
+                }
+            )
+        return list(dict.fromkeys(facets))
+
+    def filter_queryset(self, queryset):
+        self.requested_facets = self.get_requested_facets()
+        queryset = super().filter_queryset(queryset)
+        self.filtered_queryset = queryset
+        return queryset
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.requested_facets:
+            response.data["facets"] = facet_counts(
+                self.filtered_queryset, self.requested_facets
+            )
+        return response
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
 
 
-class CategoryView(MultipleFieldLookupMixin, generics.RetrieveUpdateAPIView):
+class CategoryView(
+    CachedResponseMixin,
+    MultipleFieldLookupMixin,
+    generics.RetrieveUpdateAPIView,
+):
     queryset = Category.objects.all()
-    serializer_class = CategorySerializer
+    serializer_class = CountedCategorySerializer
     lookup_fields = ["pk", "slug"]
+    cache_generations = (CATEGORY_RESPONSES,)
 
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(
+    ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView
+):
     queryset = Category.objects.all()
-    serializer_class = CategorySerializer
+    serializer_class = CountedCategorySerializer
     ordering_fields = ["id", "name"]
     ordering = ["name"]
+    cache_generations = (CATEGORY_RESPONSES,)
+
+    def get_validator_queryset(self):
+        # Every category may be rendered as the child of a listed one
+        return Category.objects.all()
 
     def get_queryset(self):
         self.queryset = Category.objects.all()
@@ -68,23 +458,73 @@ class CategoryListView(generics.ListAPIView):
         return self.queryset
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class CategoryTreeView(APIView):
+    """
+    Every category nested under its parent. The rendered body is cached
+    per language until a category is saved or deleted.
+    """
+
+    def get(self, request, *args, **kwargs):
+        key = versioned_key(CATEGORY_TREE, get_language())
+        response = get_cached_response(request, key, None)
+        if response is not None:
+            return response
+
+        categories = Category.objects.order_by("name").values(
+            "id", "name", "slug", "business_count", "parent_id"
+        )
+        content = JSONRenderer().render(
+            serialize_category_tree(list(categories))
+        )
+        cache.set(key, (content, "application/json"), None)
+        return HttpResponse(content, content_type="application/json")
+
+
+class TagViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    FastListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    fast_serializer_class = FastTagListSerializer
     pagination_class = DefaultPagination
     ordering_fields = ["id", "name"]
     ordering = ["name"]
-
-
-class BusinessListView(MultipleFieldLookupMixin, generics.ListAPIView):
-    serializer_class = BusinessSerializer
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
-    search_fields = ["name", "tags__name"]
+    cache_generations = (TAG_RESPONSES,)
+
+
+class BusinessListView(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    RepresentationMixin,
+    FieldSelectionMixin,
+    FacetCountsMixin,
+    FastListMixin,
+    MultipleFieldLookupMixin,
+    generics.ListAPIView,
+):
+    filter_backends = [
+        FullTextSearchFilter,
+        DjangoFilterBackend,
+        FacetFilter,
+        OpenAtFilter,
+        NearFilter,
+    ]
     filterset_fields = ["status", "accepted_at", "category"]
     pagination_class = DefaultPagination
     ordering_fields = ["id", "name"]
     ordering = ["name"]
     lookup_fields = ["pk", "slug"]
+    cache_generations = (BUSINESS_RESPONSES,)
+    validator_generations = (BUSINESS_FRAGMENTS,)
+
+    def get_cache_variants(self):
+        if OpenAtFilter.is_open_now(self.request):
+            # The businesses open now change with every slot of the week
+            return (local_week_slot(timezone.now()),)
+        return ()
 
     def get_queryset(self):
         exclude_deleted = self.request.query_params.get(
@@ -93,6 +533,7 @@ class BusinessListView(MultipleFieldLookupMixin, generics.ListAPIView):
         status = self.request.query_params.get("status", "accepted")
         category = self.request.query_params.get("category", None)
         location = self.request.query_params.get("location", None)
+        tag = self.request.query_params.get("tag", None)
         accepted_at_after = self.request.query_params.get("accepted_at_after", None)
 
         self.queryset = Business.objects.all()
@@ -101,44 +542,71 @@ class BusinessListView(MultipleFieldLookupMixin, generics.ListAPIView):
         if exclude_deleted:
             self.queryset = self.queryset.exclude(deleted_at__isnull=False)
         if location:
-            self.queryset = self.queryset.filter(addresses__city__icontains=location)
+            self.queryset = self.queryset.filter(
+                addresses__city_key__startswith=fold(location)
+            ).distinct()
+        if tag:
+            self.queryset = self.queryset.filter(tags__name_key=fold(tag))
         if category:
             category_obj = Category.objects.get(slug=category)
             if category_obj:
                 self.queryset = self.queryset.filter(
-                    category__pk__in=category_obj.get_children_ids()
+                    category__in=category_obj.get_descendants()
                 )
         if accepted_at_after:
             formatted_date = datetime.strptime(accepted_at_after, '%Y-%m-%d')
             self.queryset = self.queryset.filter(accepted_at__gte=formatted_date.date())
 
+        self.queryset = self.get_serializer_class().setup_eager_loading(
+            self.queryset
+        )
         return self.queryset
 
 
-class BusinessView(MultipleFieldLookupMixin, generics.RetrieveUpdateAPIView):
+class BusinessView(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    RepresentationMixin,
+    FieldSelectionMixin,
+    MultipleFieldLookupMixin,
+    generics.RetrieveUpdateAPIView,
+):
     queryset = Business.objects.all()
-    serializer_class = BusinessSerializer
     lookup_fields = ["pk", "slug"]
+    cache_generations = (BUSINESS_RESPONSES,)
+    validator_generations = (BUSINESS_FRAGMENTS,)
 
-
-class BusinessAutoCompleteView(ListAPIView):
     def get_queryset(self):
-        exclude_deleted = self.request.query_params.get(
-            "exclude_deleted", False
+        return self.get_serializer_class().setup_eager_loading(
+            Business.objects.all()
         )
-        status = self.request.query_params.get("status", None)
-        self.queryset = Business.objects.all()
 
-        if exclude_deleted:
-            self.queryset = self.queryset.exclude(deleted_at__isnull=False)
-        if status is None:
-            self.queryset = self.queryset.filter(status="accepted")
-        return self.queryset
+
+class BusinessAutoCompleteView(ListAPIView):
+    max_limit = 50
 
     def list(self, request, *args, **kwargs):
         search = request.query_params.get("querySearch", None)
-        distance = request.query_params.get("distance", 0.35)
-        limit = request.query_params.get("limit", 10)
+        try:
+            distance = float(request.query_params.get("distance", 0.35))
+        except ValueError:
+            distance = None
+        # NaN fails the comparison; 1 and above match every word
+        if distance is None or not distance >= 0:
+            raise ValidationError(
+                {"distance": ["Expected a non-negative number."]}
+            )
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            raise ValidationError({"limit": ["Expected an integer."]})
+        limit = max(1, min(limit, self.max_limit))
+        exclude_deleted = bool(
+            request.query_params.get("exclude_deleted", False)
+        )
+        business_status = (
+            "accepted" if request.query_params.get("status") is None else None
+        )
 
         if search is None:
             response = Response(
@@ -147,39 +615,76 @@ class BusinessAutoCompleteView(ListAPIView):
             )
             return response
 
-        full_business_list = self.get_queryset()
-        search_matching_business_list = self.get_queryset().filter(
-            Q(name__contains=search) | Q(tags__name__contains=search)
+        matching_words = fuzzy_index.search(
+            search,
+            distance,
+            limit,
+            status=business_status,
+            exclude_deleted=exclude_deleted,
         )
+        response = Response(matching_words, status=status.HTTP_200_OK)
+        return response
 
-        matching_words = set([])
-        for b in full_business_list:
-            keyword = search.lower()
-            matching_name = (
-                textdistance.levenshtein.normalized_distance(
-                    b.name.lower(), keyword
-                )
-                < distance
+
+class BusinessChangesView(APIView):
+    """
+    Businesses written since the `since` sync token (or ISO timestamp),
+    oldest first. Clients upsert `upserted`, drop the `deleted` ids and
+    pass `sync_token` back as `since`, right away while `has_more`.
+    """
+
+    page_size = 100
+    max_page_size = 500
+
+    def get(self, request, *args, **kwargs):
+        since = request.query_params.get("since", None)
+        business_status = request.query_params.get("status", "accepted")
+        try:
+            page_size = int(
+                request.query_params.get("page_size", self.page_size)
+            )
+            page_size = max(1, min(page_size, self.max_page_size))
+            upserted, deleted, sync_token, has_more = changes(
+                BusinessSerializer.setup_eager_loading(Business.objects.all()),
+                business_status,
+                since,
+                page_size,
+            )
+        except ValueError as e:
+            return Response(
+                {"message": str(e)}, status=status.HTTP_400_BAD_REQUEST
             )
 
-            if matching_name:
-                matching_words.add(b.name)
+        return Response(
+            {
+                "upserted": BusinessSerializer(
+                    upserted, many=True, context={"request": request}
+                ).data,
+                "deleted": deleted,
+                "sync_token": sync_token,
+                "has_more": has_more,
+            }
+        )
 
-            for tag in b.tags.all():
-                matching_tag = (
-                    textdistance.levenshtein.normalized_distance(
-                        tag.name.lower(), keyword
-                    )
-                    < distance
-                )
-                if matching_tag:
-                    matching_words.add(tag.name)
 
-        for b in search_matching_business_list:
-            matching_words.add(b.name)
+class BusinessExportView(APIView):
+    """
+    Every business with `status` (accepted by default), streamed as NDJSON
+    or CSV (`?format=csv` or the Accept header) without loading them all.
+    """
 
-        matching_words = list(matching_words)[0:limit]
-        response = Response(matching_words, status=status.HTTP_200_OK)
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    def get(self, request, *args, **kwargs):
+        business_status = request.query_params.get("status", "accepted")
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(export_records(export_queryset(business_status))),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="businesses.{renderer.format}"'
+        )
         return response
 
 
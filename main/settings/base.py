@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "backend.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,9 +76,39 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "backend.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "SEARCH_PARAM": "querySearch",
     'EXCEPTION_HANDLER': 'backend.exceptions.custom_exception_handler'
 }
+
+# Paginated results the PostgreSQL planner expects to hold more rows than
+# this are not counted: `items_count` is null and the planner estimate is
+# returned as `estimated_items_count`. None always counts.
+ESTIMATED_COUNT_THRESHOLD = None
+
+# Ids computed in Python (search candidates, facet bitsets, businesses in
+# a radius) are only sent to the database as `id IN (...)` up to this
+# many. Above, filters fall back to joins and expressions in SQL.
+MAX_FILTER_IDS = 500
+
+# Seconds a business write may take to commit after `updated_at` was
+# stamped. The changes feed resends more recent writes until they are
+# older than this, see `backend.sync.changes`.
+SYNC_SAFETY_WINDOW = 60
+
+# Shared by the web workers and the management commands: cached responses,
+# indexes and counts are invalidated through generations stored in it, see
+# `backend.cache`. The table is created by `createcachetable` (release.sh).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "backend_cache",
+    }
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
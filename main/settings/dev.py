@@ -13,3 +13,12 @@ DATABASES = {
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),  # noqa: F405
     }
 }
+
+# runserver and the tests are a single process. Management commands do not
+# invalidate what runserver cached, restart it after running one.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+SILENCED_SYSTEM_CHECKS = ["backend.E001"]
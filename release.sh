@@ -1,3 +1,5 @@
 echo "Running migrations ..."
 python manage.py migrate
 
+echo "Creating the cache table ..."
+python manage.py createcachetable